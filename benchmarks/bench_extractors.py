@@ -0,0 +1,81 @@
+"""
+Micro-benchmark: the old full-buffer regex vs. the streaming extractors.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_extractors [entries]
+"""
+
+import asyncio
+import re
+import sys
+import time
+import tracemalloc
+
+from src.extractors import TITLE01_PATTERN, compile_rule, extract_stream
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_page(entries: int) -> bytes:
+    items = "".join(
+        f'<li><h3 class="title01">\n  <a href="/news/{i}">ニュース {i}</a>\n</h3>'
+        f"<p>{'本文' * 40}</p></li>\n"
+        for i in range(entries, 0, -1)
+    )
+    return f"<html><body><ul>{items}</ul></body></html>".encode("utf-8")
+
+
+async def chunks(body: bytes):
+    for i in range(0, len(body), CHUNK_SIZE):
+        yield body[i : i + CHUNK_SIZE]
+
+
+def measure(label: str, func, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    # メモリ計測は時間計測に影響するので別に1回だけ実行する
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<40} {best * 1000:9.1f} ms  peak {peak / 2**20:7.1f} MiB  {result}")
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    body = build_page(entries)
+    print(f"page: {len(body) / 2**20:.1f} MiB, {entries} entries\n")
+
+    def baseline():
+        return len(re.findall(TITLE01_PATTERN, body.decode("utf-8")))
+
+    measure("re.findall on full page (current)", baseline)
+
+    newest_known = (f"/news/{entries - 10}", f"ニュース {entries - 10}")
+    rules = {
+        "regex": compile_rule("title01"),
+        "css": compile_rule({"type": "css", "selector": "h3.title01 > a"}),
+        "xpath": compile_rule({"type": "xpath", "path": '//h3[@class="title01"]/a'}),
+    }
+    for name, rule in rules.items():
+
+        def full(rule=rule):
+            found, _ = asyncio.run(extract_stream(chunks(body), rule))
+            return len(found)
+
+        def early(rule=rule):
+            found, _ = asyncio.run(
+                extract_stream(chunks(body), rule, stop_at=newest_known)
+            )
+            return len(found)
+
+        measure(f"stream {name}, full page", full)
+        measure(f"stream {name}, stop at known entry", early)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,46 @@ __all__ = [
     "BOT_FILE_PATH",
     "XAPP_TOKEN",
     "XOXB_TOKEN",
+    "WATCH_TARGETS",
+    "MAX_CONCURRENT_FETCHES",
+    "MAX_FETCHES_PER_HOST",
+    "MAX_SEEN_ENTRIES",
+    "STATE_DB",
+    "SNAPSHOT_RETENTION_DAYS",
+    "MIN_CHECK_INTERVAL",
+    "MAX_CHECK_INTERVAL",
+    "ERROR_BACKOFF_BASE",
+    "SLACK_UPDATE_CHANNEL",
+    "AUDIO_PREPROCESS",
+    "TRANSCRIBE_CONCURRENCY",
+    "TRANSCRIBE_MODE",
+    "TRANSCRIBE_MODEL",
+    "TRANSCRIPT_CACHE_MAX_MB",
+    "TRANSCRIPT_CACHE_DAYS",
+    "AUDIO_WORKSPACE_ROOT",
+    "AUDIO_WORKSPACE_QUOTA_MB",
+    "TRANSCRIBE_BASE_URL",
+    "TRANSCRIBE_BACKEND",
+    "LOCAL_WHISPER_MODEL",
+    "LOCAL_WHISPER_WORKERS",
+    "LOCAL_WHISPER_LANGUAGE",
+    "CHAT_JOB_WORKERS",
+    "AUDIO_JOB_WORKERS",
+    "DEV_JOB_WORKERS",
+    "JOB_PROCESS_WORKERS",
+    "SLACK_EVENT_TTL",
+    "HTTP_MAX_CONNECTIONS",
+    "HTTP_MAX_PER_HOST",
+    "HTTP_DNS_TTL",
+    "HTTP_CONNECT_TIMEOUT",
+    "HTTP_READ_TIMEOUT",
+    "HTTP_RETRIES",
+    "CONVERSATION_TOKEN_BUDGET",
+    "MAX_CONVERSATIONS",
+    "CONVERSATION_MEMORY_TOKENS",
+    "CHAT_STREAMING",
+    "CHAT_EDIT_INTERVAL",
+    "CHAT_CACHE_TTL",
+    "CHAT_CACHE_MAX_ENTRIES",
+    "GITHUB_CACHE_TTL",
 ]
@@ -17,3 +17,45 @@ FORKED_REPO_NAME: str
 BOT_FILE_PATH: str
 XAPP_TOKEN: str
 XOXB_TOKEN: str
+WATCH_TARGETS: list[dict]
+MAX_CONCURRENT_FETCHES: int
+MAX_FETCHES_PER_HOST: int
+MAX_SEEN_ENTRIES: int
+STATE_DB: str
+SNAPSHOT_RETENTION_DAYS: float
+MIN_CHECK_INTERVAL: int
+MAX_CHECK_INTERVAL: int
+ERROR_BACKOFF_BASE: int
+SLACK_UPDATE_CHANNEL: str
+AUDIO_PREPROCESS: bool
+TRANSCRIBE_CONCURRENCY: int
+TRANSCRIBE_MODE: str
+TRANSCRIBE_MODEL: str
+TRANSCRIPT_CACHE_MAX_MB: int
+TRANSCRIPT_CACHE_DAYS: int
+AUDIO_WORKSPACE_ROOT: str
+AUDIO_WORKSPACE_QUOTA_MB: int
+TRANSCRIBE_BASE_URL: str
+TRANSCRIBE_BACKEND: str
+LOCAL_WHISPER_MODEL: str
+LOCAL_WHISPER_WORKERS: int
+LOCAL_WHISPER_LANGUAGE: str
+CHAT_JOB_WORKERS: int
+AUDIO_JOB_WORKERS: int
+DEV_JOB_WORKERS: int
+JOB_PROCESS_WORKERS: int
+SLACK_EVENT_TTL: int
+HTTP_MAX_CONNECTIONS: int
+HTTP_MAX_PER_HOST: int
+HTTP_DNS_TTL: int
+HTTP_CONNECT_TIMEOUT: float
+HTTP_READ_TIMEOUT: float
+HTTP_RETRIES: int
+CONVERSATION_TOKEN_BUDGET: int
+MAX_CONVERSATIONS: int
+CONVERSATION_MEMORY_TOKENS: int
+CHAT_STREAMING: bool
+CHAT_EDIT_INTERVAL: float
+CHAT_CACHE_TTL: float
+CHAT_CACHE_MAX_ENTRIES: int
+GITHUB_CACHE_TTL: float
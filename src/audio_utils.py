@@ -1,6 +1,13 @@
+import asyncio
 import os
+import re
 import subprocess
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncGenerator, AsyncIterator, Callable
+
+from .workspace import QuotaExceeded
 
 # ロガーの設定
 logging.basicConfig(
@@ -9,159 +16,605 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_audio_duration_seconds(input_file: str) -> float:
+# Whisper APIのアップロード上限は25MB。コンテナのオーバーヘッド分の余裕を持たせる
+WHISPER_MAX_BYTES = 25 * 1024 * 1024
+DEFAULT_MAX_CHUNK_BYTES = WHISPER_MAX_BYTES - 1024 * 1024
+
+# 再エンコードせずにそのまま切り出せるコーデック -> (segment_format, 拡張子)
+STREAM_COPY_FORMATS = {
+    "aac": ("mp4", "m4a"),
+    "mp3": ("mp3", "mp3"),
+    "opus": ("ogg", "ogg"),
+    "vorbis": ("ogg", "ogg"),
+    "flac": ("flac", "flac"),
+}
+
+# 音声認識向けの前処理: 無音区間の削除（先頭・末尾・2秒以上の途中の無音）
+SILENCE_FILTER = (
+    "silenceremove=start_periods=1:start_silence=0.3:start_threshold=-45dB:"
+    "stop_periods=-1:stop_duration=2:stop_silence=0.5:stop_threshold=-45dB"
+)
+SPEECH_BITRATE = 24_000
+
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_BITRATE = re.compile(r"bitrate: (\d+) kb/s")
+_AUDIO_STREAM = re.compile(r"Stream #\S+.*?: Audio: (\w+)(?:[^\n]*?, (\d+) kb/s)?")
+
+
+def probe_audio(input_file: str) -> dict:
     """
-    Returns the duration (in seconds) of the given audio file by calling ffprobe.
-    Raises ValueError if ffprobe fails.
+    Reads the container header with ffmpeg itself (no ffprobe, no decoding)
+    and returns `duration` (s), `bitrate` (bits/s) and `codec`, each None if
+    ffmpeg did not report it.
     """
-    command = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        input_file,
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", input_file],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=30,
+    )
+    info: dict = {"duration": None, "bitrate": None, "codec": None}
+    if m := _DURATION.search(result.stderr):
+        hours, minutes, seconds = m.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    if m := _AUDIO_STREAM.search(result.stderr):
+        info["codec"] = m.group(1)
+        if m.group(2):
+            info["bitrate"] = int(m.group(2)) * 1000
+    if info["bitrate"] is None and (m := _BITRATE.search(result.stderr)):
+        info["bitrate"] = int(m.group(1)) * 1000
+    if info["codec"] is None:
+        raise ValueError(f"No audio stream found in {input_file}:\n{result.stderr}")
+    return info
+
+
+@lru_cache(maxsize=1)
+def has_encoder(name: str) -> bool:
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-encoders"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        timeout=30,
+    )
+    return any(line.split()[1:2] == [name] for line in result.stdout.splitlines())
+
+
+def speech_encoding(
+    bitrate: int = SPEECH_BITRATE, extra_filter: str = ""
+) -> tuple[list[str], str, str]:
+    """
+    Returns the ffmpeg arguments, segment format and extension that downmix
+    to mono 16 kHz, drop long silences and encode for speech: Opus when
+    libopus is available, low-bitrate AAC otherwise. `extra_filter` is
+    appended to the silence filter.
+    """
+    filters = f"{SILENCE_FILTER},{extra_filter}" if extra_filter else SILENCE_FILTER
+    args = ["-af", filters, "-ac", "1", "-ar", "16000"]
+    if has_encoder("libopus"):
+        args += ["-c:a", "libopus", "-b:a", str(bitrate), "-application", "voip"]
+        return args, "ogg", "ogg"
+    args += ["-c:a", "aac", "-b:a", str(max(bitrate, 32_000))]
+    return args, "mp4", "m4a"
+
+
+_SILENCE_START = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+_PROGRESS_TIME = re.compile(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def detect_silences(
+    input_file: str,
+    pre_filter: str = "",
+    noise_db: float = -35,
+    min_silence_s: float = 0.3,
+) -> tuple[list[tuple[float, float]], float | None]:
+    """
+    Runs a decode-only ffmpeg pass with `silencedetect` and returns the
+    `(start, end)` of every pause plus the decoded duration.
+
+    Timestamps are those after `pre_filter`, so that pauses line up with
+    the output when the same filter is applied while segmenting. The audio
+    is downmixed to 8 kHz mono first, which keeps the pass cheap.
+    """
+    filters = [pre_filter] if pre_filter else []
+    filters += [
+        "aresample=8000",
+        "aformat=channel_layouts=mono",
+        silencedetect_filter(noise_db, min_silence_s),
     ]
-    try:
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            timeout=30,
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-nostdin",
+            "-i",
+            input_file,
+            "-map",
+            "0:a:0",
+            "-af",
+            ",".join(filters),
+            "-f",
+            "null",
+            "-",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=1800,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg error while detecting silences: {result.stderr}")
+    return parse_silences(result.stderr)
+
+
+def silencedetect_filter(noise_db: float = -35, min_silence_s: float = 0.3) -> str:
+    return f"silencedetect=noise={noise_db}dB:d={min_silence_s}"
+
+
+def parse_silences(log: str) -> tuple[list[tuple[float, float]], float | None]:
+    """Reads pauses and the final duration from ffmpeg's `silencedetect` log."""
+    silences = []
+    start = None
+    for line in log.splitlines():
+        if m := _SILENCE_START.search(line):
+            start = max(0.0, float(m.group(1)))
+        elif (m := _SILENCE_END.search(line)) and start is not None:
+            silences.append((start, float(m.group(1))))
+            start = None
+    duration = None
+    if times := _PROGRESS_TIME.findall(log):
+        hours, minutes, seconds = times[-1]
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    if start is not None and duration is not None:
+        silences.append((start, duration))  # 末尾まで続く無音
+    return silences, duration
+
+
+def plan_boundaries(
+    duration: float,
+    chunk_s: float,
+    silences: list[tuple[float, float]],
+    search_s: float = 60.0,
+) -> list[float]:
+    """
+    Returns the cut points for chunks of at most `chunk_s` seconds.
+
+    Each cut is placed in the middle of the last pause that ends within
+    `search_s` before the limit (clipped so the chunk never gets longer
+    than `chunk_s`); only when there is no such pause is the audio cut at
+    the limit itself.
+    """
+    cuts: list[float] = []
+    start = 0.0
+    while duration - start > chunk_s:
+        limit = start + chunk_s
+        floor = max(start + 1.0, limit - search_s)
+        cut = limit
+        for silence_start, silence_end in reversed(silences):
+            if silence_start >= limit:
+                continue
+            if silence_end <= floor:
+                break
+            cut = min(limit, max(floor, (silence_start + silence_end) / 2))
+            break
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def plan_chunk_seconds(
+    bitrate: int, max_chunk_bytes: int, safety: float = 0.92
+) -> float:
+    """Returns the longest chunk duration whose size stays under the limit."""
+    return max(1.0, max_chunk_bytes * 8 * safety / bitrate)
+
+
+@dataclass
+class SegmentPlan:
+    """How `segment_audio` encodes a file and where it may cut it."""
+
+    codec_args: list[str]
+    segment_format: str
+    ext: str
+    mode: str
+    chunk_s: float
+    duration: float
+    silences: list[tuple[float, float]] = field(default_factory=list)
+    search_s: float = 60.0
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.cuts()) + 1
+
+    def cuts(self) -> list[float]:
+        return plan_boundaries(
+            self.duration, self.chunk_s, self.silences, self.search_s
         )
-        if result.returncode == 0:
-            return float(result.stdout.strip())
-        else:
-            raise ValueError(
-                f"Error retrieving duration for {input_file}:\n{result.stderr}"
-            )
-    except subprocess.TimeoutExpired:
-        raise TimeoutError(f"ffprobe timed out when processing {input_file}")
-    except Exception as e:
-        raise ValueError(f"Unexpected error processing {input_file}: {str(e)}")
 
 
-def split_audio_with_overlap(
+def plan_segments(
+    input_file: str,
+    max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+    max_chunk_s: float | None = None,
+    encode_bitrate: int = 128_000,
+    preprocess: bool = False,
+    search_s: float = 60.0,
+) -> SegmentPlan:
+    """
+    Probes `input_file`, picks the output encoding and detects pauses if the
+    audio needs more than one chunk. Parameters are as for `segment_audio`.
+    """
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+
+    info = probe_audio(input_file)
+    logger.info(
+        f"Probed {input_file}: codec={info['codec']} "
+        f"bitrate={info['bitrate']} duration={info['duration']}"
+    )
+    if preprocess:
+        codec_args, segment_format, ext = speech_encoding()
+        bitrate = SPEECH_BITRATE
+        mode = "speech"
+    elif info["codec"] in STREAM_COPY_FORMATS and info["bitrate"]:
+        segment_format, ext = STREAM_COPY_FORMATS[info["codec"]]
+        codec_args = ["-c:a", "copy"]
+        bitrate = info["bitrate"]
+        mode = "stream copy"
+    else:
+        segment_format, ext = "mp4", "m4a"
+        codec_args = ["-c:a", "aac", "-b:a", str(encode_bitrate)]
+        bitrate = encode_bitrate
+        mode = "aac"
+
+    chunk_s = plan_chunk_seconds(bitrate, max_chunk_bytes)
+    if max_chunk_s:
+        chunk_s = min(chunk_s, max_chunk_s)
+
+    # 1チャンクに収まる場合は無音検出を省略する（前処理後は元より短くなる）
+    duration = info["duration"]
+    silences: list[tuple[float, float]] = []
+    if duration is None or duration > chunk_s:
+        silences, detected = detect_silences(
+            input_file, pre_filter=SILENCE_FILTER if preprocess else ""
+        )
+        duration = detected or duration
+        logger.info(f"Detected {len(silences)} pauses in {input_file}")
+
+    return SegmentPlan(
+        codec_args,
+        segment_format,
+        ext,
+        mode,
+        chunk_s,
+        duration or 0.0,
+        silences,
+        search_s,
+    )
+
+
+def segment_audio(
     input_file: str,
     output_dir: str = "chunks",
-    chunk_length_ms: int = 12 * 60_000 + 2_000,  # 12 min + 10 sec
-    overlap_ms: int = 2_000,  # 2 sec
+    max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+    max_chunk_s: float | None = None,
+    encode_bitrate: int = 128_000,
+    preprocess: bool = False,
+    search_s: float = 60.0,
 ) -> list:
     """
-    Splits the input audio file into chunks of `chunk_length_ms` duration,
-    with each chunk overlapping the last `overlap_ms` of the previous one.
-    Utilizes ffmpeg for slicing, storing each chunk in M4A (MP4 container).
+    Splits the input audio into chunks that each fit under `max_chunk_bytes`,
+    using a single ffmpeg invocation with the segment muxer.
+
+    When the input codec can be uploaded as-is, packets are stream-copied
+    and the chunk length is planned from the input bitrate; otherwise the
+    audio is re-encoded to AAC at `encode_bitrate`. With `preprocess`, the
+    audio is instead converted for speech in the same pass (see
+    `speech_encoding`), which usually shrinks the upload several-fold.
+    Chunks are contiguous, without overlap, and are cut in pauses found by
+    `detect_silences` (see `plan_boundaries`), so no word is split and each
+    chunk can be transcribed on its own.
 
     :param input_file: Path to the input .m4a (or any FFmpeg-readable) file.
     :param output_dir: Directory to store the split audio files.
-    :param chunk_length_ms: Length of each chunk in milliseconds.
-    :param overlap_ms: Overlap duration in milliseconds.
+    :param max_chunk_bytes: Size limit of a single chunk.
+    :param max_chunk_s: Optional upper bound for a chunk's duration.
+    :param encode_bitrate: AAC bitrate (bits/s) used when re-encoding.
+    :param preprocess: Convert to low-bitrate mono speech and drop silences.
+    :param search_s: How far before a chunk's limit to look for a pause.
     """
+    plan = plan_segments(
+        input_file, max_chunk_bytes, max_chunk_s, encode_bitrate, preprocess, search_s
+    )
+    os.makedirs(output_dir, exist_ok=True)
 
-    chunk_paths = []
+    while True:
+        chunk_paths = _run_segmenter(input_file, output_dir, plan)
+        largest = max(os.path.getsize(p) for p in chunk_paths)
+        if largest <= max_chunk_bytes or plan.chunk_s <= 1.0:
+            break
+        # VBRなどで上限を超えた場合は短くしてやり直す（無音の位置は再利用する）
+        logger.warning(
+            f"Chunk of {largest} bytes exceeds {max_chunk_bytes}, re-planning"
+        )
+        for path in chunk_paths:
+            os.remove(path)
+        plan.chunk_s = max(1.0, plan.chunk_s * max_chunk_bytes / largest * 0.95)
+
+    output_bytes = sum(os.path.getsize(p) for p in chunk_paths)
+    _log_segmented(input_file, len(chunk_paths), output_bytes, plan)
+    return chunk_paths
 
-    # 入力ファイルの存在確認
-    if not os.path.exists(input_file):
-        raise FileNotFoundError(f"Input file not found: {input_file}")
 
-    # Ensure output directory exists
+async def iter_segments(
+    input_file: str,
+    output_dir: str = "chunks",
+    max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+    max_chunk_s: float | None = None,
+    encode_bitrate: int = 128_000,
+    preprocess: bool = False,
+    search_s: float = 60.0,
+    on_plan: Callable[[SegmentPlan], None] | None = None,
+    plan: SegmentPlan | None = None,
+    source_bytes: int | None = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Like `segment_audio`, but yields each chunk as soon as ffmpeg has
+    finished writing it, so that uploads can start while the rest of the
+    file is still being encoded. A chunk that still exceeds
+    `max_chunk_bytes` is split again on its own instead of re-running the
+    whole file. `on_plan`, if given, is called with the plan before
+    encoding starts; a ready `plan` (e.g. from `ingest_speech`) skips
+    probing and silence detection. `source_bytes` is the size of the
+    original audio when `input_file` was already converted from it, so the
+    log reports the whole reduction.
+    """
+    if plan is None:
+        plan = await asyncio.to_thread(
+            plan_segments,
+            input_file,
+            max_chunk_bytes,
+            max_chunk_s,
+            encode_bitrate,
+            preprocess,
+            search_s,
+        )
+    if on_plan is not None:
+        on_plan(plan)
     os.makedirs(output_dir, exist_ok=True)
 
+    # segment_listを標準出力に書かせ、チャンクが閉じられるたびに1行ずつ受け取る
+    process = await asyncio.create_subprocess_exec(
+        *_segmenter_command(input_file, output_dir, plan, "pipe:1"),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # 受け取った側が処理済みのチャンクを削除できるよう、サイズは渡す前に数える
+    count = output_bytes = 0
     try:
-        # Calculate total duration
-        logger.info(f"Getting duration for {input_file}")
-        total_duration_s = get_audio_duration_seconds(input_file)
-        if total_duration_s <= 0:
-            raise ValueError("Input file has zero or negative duration, cannot split.")
+        assert process.stdout is not None and process.stderr is not None
+        async for line in process.stdout:
+            name = line.decode().strip().split(",")[0]
+            if not name:
+                continue
+            path = os.path.join(output_dir, name)
+            size = os.path.getsize(path)
+            if size <= max_chunk_bytes:
+                count += 1
+                output_bytes += size
+                yield path
+                continue
+            logger.warning(f"{path} exceeds {max_chunk_bytes} bytes, splitting it")
+            parts = await asyncio.to_thread(
+                segment_audio,
+                path,
+                os.path.splitext(path)[0],
+                max_chunk_bytes,
+                search_s=search_s,
+            )
+            os.remove(path)
+            for part in parts:
+                count += 1
+                output_bytes += os.path.getsize(part)
+                yield part
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            error_msg = stderr.decode() or "Unknown error"
+            logger.error(f"FFmpeg error while segmenting: {error_msg}")
+            raise RuntimeError(f"FFmpeg error while segmenting: {error_msg}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if not count:
+        raise ValueError(f"No audio chunks were produced from {input_file}")
+    _log_segmented(input_file, count, output_bytes, plan, source_bytes)
 
-        logger.info(f"Total duration: {total_duration_s:.2f} seconds")
 
-        # Convert ms to seconds
-        chunk_length_s = chunk_length_ms / 1000.0
-        overlap_s = overlap_ms / 1000.0
-        step_s = chunk_length_s - overlap_s
+def mp4_needs_seek(head: bytes) -> bool:
+    """
+    Tells from the first bytes of a file whether it is an MP4/M4A whose
+    `moov` index comes after the media data (or is not within `head`).
+    ffmpeg cannot demux such a file from a pipe, so it must be saved first.
+    """
+    if head[4:8] != b"ftyp":
+        return False
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset : offset + 4], "big")
+        box = head[offset + 4 : offset + 8]
+        if box == b"moov":
+            return False
+        if box == b"mdat" or size < 8:
+            return True
+        offset += size
+    return True
 
-        # Start splitting
-        start_s = 0.0
-        chunk_index = 1
 
-        while start_s < total_duration_s:
-            # Calculate this chunk's actual duration in seconds
-            # (if near the end of the file, we may have a shorter final chunk)
-            chunk_duration_s = min(chunk_length_s, total_duration_s - start_s)
+async def ingest_speech(
+    source: AsyncIterator[bytes],
+    output_dir: str,
+    max_bytes: int,
+    max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+    search_s: float = 60.0,
+) -> tuple[str, SegmentPlan]:
+    """
+    Pipes `source` into ffmpeg's stdin and writes it out converted for
+    speech (see `speech_encoding`), detecting pauses in the same pass. The
+    original audio never touches the disk.
 
-            if chunk_duration_s <= 0:
-                break
+    :param max_bytes: Size limit of the converted file.
+    :return: The converted file and a stream-copy `SegmentPlan` for it.
+    :raises QuotaExceeded: If the converted file would exceed `max_bytes`.
+    """
+    codec_args, segment_format, ext = speech_encoding(
+        extra_filter=silencedetect_filter()
+    )
+    output_file = os.path.join(output_dir, f"speech.{ext}")
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-y",
+        "-hide_banner",
+        "-i",
+        "pipe:0",
+        "-map",
+        "0:a:0",
+        *codec_args,
+        "-fflags",
+        "+bitexact",
+        "-flags:a",
+        "+bitexact",
+        "-fs",
+        str(max_bytes),
+        "-f",
+        segment_format,
+        output_file,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    assert process.stdin is not None and process.stderr is not None
+    # silencedetectのログでパイプが詰まらないよう、標準エラーは並行して読む
+    log_task = asyncio.create_task(process.stderr.read())
+    try:
+        async for data in source:
+            process.stdin.write(data)
+            await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # ffmpegが先に終了した。原因は終了コードとログで判断する
+    finally:
+        if process.returncode is None and not process.stdin.is_closing():
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        log = (await log_task).decode(errors="replace")
+        await process.wait()
+    if process.returncode != 0:
+        logger.error(f"FFmpeg error while ingesting audio: {log[-2000:]}")
+        raise RuntimeError(f"FFmpeg error while ingesting audio: {log[-2000:]}")
+    size = os.path.getsize(output_file)
+    if size >= max_bytes:
+        raise QuotaExceeded(f"Converted audio exceeds {max_bytes} bytes")
 
-            # Create the output path
-            chunk_name = f"chunk_{chunk_index:03d}.m4a"
-            output_path = os.path.join(output_dir, chunk_name)
+    silences, duration = parse_silences(log)
+    duration = duration or 0.0
+    # 実際のサイズから（コンテナのオーバーヘッド込みの）ビットレートを求める
+    bitrate = int(size * 8 / duration) if duration else SPEECH_BITRATE
+    plan = SegmentPlan(
+        ["-c:a", "copy"],
+        segment_format,
+        ext,
+        "speech",
+        plan_chunk_seconds(bitrate, max_chunk_bytes),
+        duration,
+        silences,
+        search_s,
+    )
+    logger.info(
+        f"Ingested {duration:.2f}s of audio into {size} bytes, "
+        f"{len(silences)} pauses"
+    )
+    return output_file, plan
 
-            logger.info(
-                f"Splitting chunk {chunk_index} - Start: {start_s:.2f}s, "
-                f"Duration: {chunk_duration_s:.2f}s"
-            )
 
-            try:
-                # 大きなファイルの効率的な処理のためのffmpegコマンド最適化
-                command = [
-                    "ffmpeg",
-                    "-y",
-                    "-loglevel",
-                    "error",  # エラーのみをログに出力
-                    "-ss",
-                    str(start_s),  # 開始時間
-                    "-i",
-                    input_file,  # 入力ファイル
-                    "-t",
-                    str(chunk_duration_s),  # 長さ
-                    "-c:a",
-                    "aac",  # AACエンコーダー
-                    "-b:a",
-                    "128k",  # オーディオビットレート
-                    "-threads",
-                    "4",  # 使用するスレッド数を制限
-                    "-max_muxing_queue_size",
-                    "1024",  # キューサイズを増やす
-                    "-f",
-                    "mp4",  # MP4コンテナを強制
-                    output_path,
-                ]
-
-                # サブプロセスの実行とタイムアウト設定
-                subprocess.run(
-                    command,
-                    check=True,
-                    capture_output=True,
-                    timeout=600,  # より長いタイムアウト (10分)
-                )
-
-                logger.info(
-                    f"Exported {output_path} (start={start_s:.2f}s "
-                    f"duration={chunk_duration_s:.2f}s)"
-                )
-
-                chunk_paths.append(output_path)
-
-                # Move to the next chunk start
-                start_s += step_s
-                chunk_index += 1
-
-            except subprocess.TimeoutExpired:
-                logger.error(f"FFmpeg timed out processing chunk {chunk_index}")
-                error_msg = f"FFmpeg timed out when processing chunk {chunk_index}"
-                raise TimeoutError(error_msg)
-            except subprocess.CalledProcessError as e:
-                error_msg = e.stderr.decode() if e.stderr else "Unknown error"
-                logger.error(f"FFmpeg error for chunk {chunk_index}: {error_msg}")
-                raise RuntimeError(f"FFmpeg error for chunk {chunk_index}: {error_msg}")
-
-    except Exception as e:
-        logger.error(f"Error during audio splitting: {str(e)}")
-        raise
-
-    logger.info(f"Successfully split {input_file} into {len(chunk_paths)} chunks")
-    return chunk_paths
+def _log_segmented(
+    input_file: str,
+    count: int,
+    output_bytes: int,
+    plan: SegmentPlan,
+    input_bytes: int | None = None,
+):
+    if input_bytes is None:
+        input_bytes = os.path.getsize(input_file)
+    logger.info(
+        f"Split {input_file} into {count} chunks of up to "
+        f"{plan.chunk_s:.0f}s at pauses ({plan.mode}): "
+        f"{input_bytes} -> {output_bytes} bytes "
+        f"({output_bytes / max(input_bytes, 1):.0%})"
+    )
+
+
+def _segmenter_command(
+    input_file: str, output_dir: str, plan: SegmentPlan, list_path: str
+) -> list[str]:
+    cuts = plan.cuts()
+    return [
+        "ffmpeg",
+        "-y",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        input_file,
+        "-map",
+        "0:a:0",  # 音声のみ（カバー画像などは除外）
+        *plan.codec_args,
+        # 同じ入力から同じバイト列を出力させ、チャンク単位でキャッシュできるようにする
+        "-fflags",
+        "+bitexact",
+        "-flags:a",
+        "+bitexact",
+        "-f",
+        "segment",
+        # 分割点がなければ1チャンクにまとめる
+        *(
+            ["-segment_times", ",".join(f"{cut:.3f}" for cut in cuts)]
+            if cuts
+            else ["-segment_time", "86400"]
+        ),
+        "-segment_format",
+        plan.segment_format,
+        "-segment_list",
+        list_path,
+        "-segment_list_type",
+        "csv",
+        "-reset_timestamps",
+        "1",
+        os.path.join(output_dir, f"chunk_%03d.{plan.ext}"),
+    ]
+
+
+def _run_segmenter(input_file: str, output_dir: str, plan: SegmentPlan) -> list[str]:
+    list_path = os.path.join(output_dir, "chunks.csv")
+    command = _segmenter_command(input_file, output_dir, plan, list_path)
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=1800)
+    except subprocess.TimeoutExpired:
+        raise TimeoutError(f"FFmpeg timed out when segmenting {input_file}")
+    except subprocess.CalledProcessError as e:
+        error_msg = e.stderr.decode() if e.stderr else "Unknown error"
+        logger.error(f"FFmpeg error while segmenting: {error_msg}")
+        raise RuntimeError(f"FFmpeg error while segmenting: {error_msg}")
+
+    # segment_list (CSV: ファイル名,開始,終了) から出力されたチャンクを取得する
+    with open(list_path, "r", encoding="utf-8") as f:
+        rows = [line.strip().split(",") for line in f if line.strip()]
+    os.remove(list_path)
+    if not rows:
+        raise ValueError(f"No audio chunks were produced from {input_file}")
+    logger.info(f"Segmented duration: {float(rows[-1][2]):.2f} seconds")
+    return [os.path.join(output_dir, row[0]) for row in rows]
@@ -2,21 +2,33 @@ from typing import Any
 import discord
 import asyncio
 import aiohttp
-import re
-import os
+import hashlib
+import json
 import logging
 import random
-from datetime import datetime
-from config.config import CACHE_FILE
+from contextlib import aclosing
 from config import config
 from .dev import handle_dev_message_sync
-from .dev import transcribe_audio
-from github import Github
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-import requests
-import tempfile
-from .audio_utils import split_audio_with_overlap
+from .jobs import Job, JobCancelled, JobExecutor
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.aiohttp import AsyncSocketModeHandler
+from .conversations import ConversationStore
+from .dedupe import RecentKeys
+from .github_api import GitHubClient
+from .http_client import HttpClient, iter_sse
+from .outbox import Outbox
+from .response_cache import ResponseCache, request_key
+from .scheduler import PollScheduler
+from .sender import LiveText, MessageSender
+from .snapshot_store import SnapshotStore
+from .transcript_cache import TranscriptCache
+from .transcription import TranscriptionPipeline, TranscriptionProgress
+from .transcription_backends import (
+    LocalWhisperBackend,
+    OpenAIBackend,
+    TranscriptionBackend,
+)
+from .watcher import SiteWatcher, WatchTarget
 
 TOKEN = config.TOKEN
 CHANNEL_ID = getattr(config, "CHANNEL_ID", 0)
@@ -31,6 +43,50 @@ GPT_MODEL = config.GPT_MODEL
 ERROR_MESSAGE = getattr(config, "ERROR_MESSAGE", "")
 SITE_UPDATE_MESSAGE = getattr(config, "SITE_UPDATE_MESSAGE", "{titles_text}")
 PAT = getattr(config, "PAT", "")
+CACHE_FILE = getattr(config, "CACHE_FILE", "")
+WATCH_TARGETS = getattr(config, "WATCH_TARGETS", [])
+MAX_CONCURRENT_FETCHES = getattr(config, "MAX_CONCURRENT_FETCHES", 20)
+MAX_FETCHES_PER_HOST = getattr(config, "MAX_FETCHES_PER_HOST", 4)
+MAX_SEEN_ENTRIES = getattr(config, "MAX_SEEN_ENTRIES", 10000)
+STATE_DB = getattr(config, "STATE_DB", "site_state.db")
+SNAPSHOT_RETENTION_DAYS = getattr(config, "SNAPSHOT_RETENTION_DAYS", 30)
+MIN_CHECK_INTERVAL = getattr(config, "MIN_CHECK_INTERVAL", CHECK_INTERVAL)
+MAX_CHECK_INTERVAL = getattr(config, "MAX_CHECK_INTERVAL", CHECK_INTERVAL)
+ERROR_BACKOFF_BASE = getattr(config, "ERROR_BACKOFF_BASE", 60)
+SLACK_UPDATE_CHANNEL = getattr(config, "SLACK_UPDATE_CHANNEL", "")
+SLACK_EVENT_TTL = getattr(config, "SLACK_EVENT_TTL", 3600)
+AUDIO_PREPROCESS = getattr(config, "AUDIO_PREPROCESS", True)
+TRANSCRIBE_CONCURRENCY = getattr(config, "TRANSCRIBE_CONCURRENCY", 4)
+TRANSCRIBE_MODE = getattr(config, "TRANSCRIBE_MODE", "parallel")
+TRANSCRIPT_CACHE_MAX_MB = getattr(config, "TRANSCRIPT_CACHE_MAX_MB", 200)
+TRANSCRIPT_CACHE_DAYS = getattr(config, "TRANSCRIPT_CACHE_DAYS", 90)
+AUDIO_WORKSPACE_ROOT = getattr(config, "AUDIO_WORKSPACE_ROOT", "")
+AUDIO_WORKSPACE_QUOTA_MB = getattr(config, "AUDIO_WORKSPACE_QUOTA_MB", 512)
+TRANSCRIBE_BACKEND = getattr(config, "TRANSCRIBE_BACKEND", "openai")
+TRANSCRIBE_MODEL = getattr(config, "TRANSCRIBE_MODEL", "whisper-1")
+TRANSCRIBE_BASE_URL = getattr(config, "TRANSCRIBE_BASE_URL", "")
+LOCAL_WHISPER_MODEL = getattr(config, "LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_WORKERS = getattr(config, "LOCAL_WHISPER_WORKERS", 0)
+LOCAL_WHISPER_LANGUAGE = getattr(config, "LOCAL_WHISPER_LANGUAGE", "")
+CHAT_JOB_WORKERS = getattr(config, "CHAT_JOB_WORKERS", 8)
+AUDIO_JOB_WORKERS = getattr(config, "AUDIO_JOB_WORKERS", 2)
+DEV_JOB_WORKERS = getattr(config, "DEV_JOB_WORKERS", 2)
+JOB_PROCESS_WORKERS = getattr(config, "JOB_PROCESS_WORKERS", 2)
+HTTP_MAX_CONNECTIONS = getattr(config, "HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_PER_HOST = getattr(config, "HTTP_MAX_PER_HOST", 16)
+HTTP_DNS_TTL = getattr(config, "HTTP_DNS_TTL", 300)
+HTTP_CONNECT_TIMEOUT = getattr(config, "HTTP_CONNECT_TIMEOUT", 10)
+HTTP_READ_TIMEOUT = getattr(config, "HTTP_READ_TIMEOUT", 180)
+HTTP_RETRIES = getattr(config, "HTTP_RETRIES", 3)
+CONVERSATION_TOKEN_BUDGET = getattr(config, "CONVERSATION_TOKEN_BUDGET", 4000)
+MAX_CONVERSATIONS = getattr(config, "MAX_CONVERSATIONS", 1000)
+CONVERSATION_MEMORY_TOKENS = getattr(config, "CONVERSATION_MEMORY_TOKENS", 2000000)
+CHAT_STREAMING = getattr(config, "CHAT_STREAMING", True)
+CHAT_EDIT_INTERVAL = getattr(config, "CHAT_EDIT_INTERVAL", 1.0)
+CHAT_CACHE_TTL = getattr(config, "CHAT_CACHE_TTL", 0)
+CHAT_CACHE_MAX_ENTRIES = getattr(config, "CHAT_CACHE_MAX_ENTRIES", 256)
+REPO_NAME = getattr(config, "REPO_NAME", "")
+GITHUB_CACHE_TTL = getattr(config, "GITHUB_CACHE_TTL", 60)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -41,66 +97,187 @@ logging.basicConfig(
 # Discord setup
 intents = discord.Intents.default()
 intents.message_content = True
-client = discord.Client(intents=intents)
 
 # Slack setup
 bot_token = getattr(config, "XOXB_TOKEN", "")
 app_token = getattr(config, "XAPP_TOKEN", "")
 
-previous_content = None
-if CACHE_FILE:
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                previous_content = f.read()
-            logging.info("キャッシュファイルから前回の内容を読み込みました。")
-        except Exception as e:
-            logging.error(f"キャッシュファイルの読み込みに失敗しました: {e}")
+# 長文はDiscord/Slackの文字数制限に合わせて分割して送る
+sender = MessageSender()
+background_started = False
+watch_targets: list[WatchTarget] = []
+
+# 接続・プロセスプール・DBを持つオブジェクトはmain()からsetup()で作る。
+# spawnしたワーカーがこのモジュールを__mp_main__として読み込んでも作られない
+client: discord.Client = None  # type: ignore[assignment]
+outbox: Outbox = None  # type: ignore[assignment]
+http_client: HttpClient = None  # type: ignore[assignment]
+github_api: GitHubClient = None  # type: ignore[assignment]
+job_executor: JobExecutor = None  # type: ignore[assignment]
+transcription_backend: TranscriptionBackend = None  # type: ignore[assignment]
+transcription: TranscriptionPipeline = None  # type: ignore[assignment]
+slack_app: AsyncApp = None  # type: ignore[assignment]
+
+
+def build_watch_targets() -> list[WatchTarget]:
+    defaults = {
+        "channel_id": CHANNEL_ID,
+        "interval": CHECK_INTERVAL,
+        "min_interval": MIN_CHECK_INTERVAL,
+        "max_interval": MAX_CHECK_INTERVAL,
+        "message": SITE_UPDATE_MESSAGE,
+        "slack_channel": SLACK_UPDATE_CHANNEL,
+    }
+    targets = [WatchTarget.from_config(entry, defaults) for entry in WATCH_TARGETS]
+    # 従来の単一URL設定も1件のターゲットとして扱う
+    if CHECK_URL and CHANNEL_ID:
+        targets.append(
+            WatchTarget.from_config(
+                {"name": "default", "url": CHECK_URL, "cache_file": CACHE_FILE},
+                defaults,
+            )
+        )
+    return targets
+
+
+async def send_discord(channel_id: str, text: str):
+    channel = client.get_channel(int(channel_id))
+    if not channel:
+        raise RuntimeError(f"指定したチャンネルが見つかりません: {channel_id}")
+    await sender.send_discord(channel, text)
+
+
+async def notify_site_update(
+    target: WatchTarget, added_entries: list, revision: str = ""
+):
+    formatted_list = []
+    for url, title in added_entries:
+        formatted_list.append(f"タイトル: {title}\nURL: {url}")
+    titles_text = "\n\n".join(formatted_list)
+    message_to_send = target.message.format(titles_text=titles_text)
+    # 同じ更新を再検知しても二重に送信しないためのキー。
+    # セクションの再更新は表示が同じでもrevisionで区別する
+    key = hashlib.blake2b(
+        json.dumps([target.name, revision, added_entries], ensure_ascii=False).encode(),
+        digest_size=16,
+    ).hexdigest()
+    if target.channel_id:
+        outbox.enqueue("discord", str(target.channel_id), message_to_send, key)
+    if target.slack_channel and bot_token:
+        outbox.enqueue("slack", target.slack_channel, message_to_send, key)
+    logging.info(f"[{target.name}] 更新を検知し、以下の内容で通知を登録しました:")
+    logging.info(titles_text)
+
+
+CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+# CHAT_CACHE_TTLが0なら同時リクエストの共有だけを行う
+chat_cache = ResponseCache(ttl=CHAT_CACHE_TTL, max_entries=CHAT_CACHE_MAX_ENTRIES)
+# 生成中の返信の末尾に付け、続きがあることを示す
+STREAMING_CURSOR = " ▌"
+
+
+def chatgpt_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {CHATGPT_TOKEN}",
+        "Content-Type": "application/json",
+    }
 
 
-def extract_titles(html: str):
-    pattern = r'<h3 class="title01">\s*<a href="([^"]+)">([^<]+)</a>\s*</h3>'
-    return re.findall(pattern, html)
+def is_single_turn(messages: list[dict]) -> bool:
+    # 履歴に依存しない一問一答（システムプロンプトと質問だけ）を指す
+    return len(messages) == 2
 
 
-def update_cache(new_content: str):
-    try:
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            f.write(new_content)
-        logging.info("キャッシュファイルを更新しました。")
-    except Exception as e:
-        logging.error(f"キャッシュファイルの更新に失敗しました: {e}")
+async def request_chatgpt(messages) -> str:
+    url = CHAT_COMPLETIONS_URL
+    headers = chatgpt_headers()
+    payload = {"model": GPT_MODEL, "messages": messages}
+    async with http_client.request(
+        "POST", url, headers=headers, json=payload
+    ) as response:
+        if response.status == 200:
+            result = await response.json()
+            answer = result["choices"][0]["message"]["content"].strip()
+            return answer
+        else:
+            error = await response.text()
+            logging.error(f"ChatGPT API request failed: {response.status} - {error}")
+            return ""
 
 
-async def fetch_site_content(session, url: str):
+async def call_chatgpt_with_history(messages):
+    # 同じ内容の同時リクエストは1回の呼び出しにまとめ、一問一答はキャッシュする
+    answer = await chat_cache.call(
+        request_key(GPT_MODEL, messages),
+        lambda: request_chatgpt(messages),
+        cacheable=is_single_turn(messages),
+    )
+    return answer or ERROR_MESSAGE
+
+
+async def request_chatgpt_stream(messages):
+    payload = {"model": GPT_MODEL, "messages": messages, "stream": True}
+    async with http_client.request(
+        "POST", CHAT_COMPLETIONS_URL, headers=chatgpt_headers(), json=payload
+    ) as response:
+        if response.status != 200:
+            error = await response.text()
+            logging.error(f"ChatGPT API request failed: {response.status} - {error}")
+            return
+        async for data in iter_sse(response):
+            if data == "[DONE]":
+                return
+            for choice in json.loads(data).get("choices", []):
+                if content := choice.get("delta", {}).get("content"):
+                    yield content
+
+
+async def stream_chatgpt(messages):
+    """
+    Yields the answer's text in pieces as the API generates it. Identical
+    requests in flight share one stream, and single-turn answers may come
+    from the cache in one piece.
+    """
+    async with aclosing(
+        chat_cache.stream(
+            request_key(GPT_MODEL, messages),
+            lambda: request_chatgpt_stream(messages),
+            cacheable=is_single_turn(messages),
+        )
+    ) as parts:
+        async for content in parts:
+            yield content
+
+
+async def reply_chatgpt_streaming(
+    message: discord.Message, messages: list[dict], key: str
+) -> str:
+    """
+    Replies to `message` as soon as the first tokens arrive and edits the
+    reply as the rest streams in, at most once per `CHAT_EDIT_INTERVAL`.
+    Returns the complete answer.
+    """
+    live = sender.live_discord(message, interval=CHAT_EDIT_INTERVAL)
+    answer = ""
     try:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            return await response.text()
-    except aiohttp.ClientError as e:
-        logging.error(f"サイト取得エラー: {e}")
+        async with aclosing(stream_chatgpt(messages)) as parts:
+            async for content in parts:
+                answer += content
+                if answer.strip():
+                    await live.update(answer + STREAMING_CURSOR, "")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # 途中まで届いた内容は残す
+        logging.error(f"ChatGPT API request failed: {e}")
+    except asyncio.CancelledError:
+        if answer.strip():
+            await live.update(answer.strip(), "", final=True)
         raise
-
-
-async def call_chatgpt_with_history(messages):
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {CHATGPT_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    payload = {"model": GPT_MODEL, "messages": messages}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                result = await response.json()
-                answer = result["choices"][0]["message"]["content"].strip()
-                return answer
-            else:
-                error = await response.text()
-                logging.error(
-                    f"ChatGPT API request failed: {response.status} - {error}"
-                )
-                return ERROR_MESSAGE
+    answer = answer.strip() or ERROR_MESSAGE
+    if answer or live.handles:
+        await live.update(answer, "", final=True)
+    for reply in live.handles:
+        conversations.link(reply.id, key)
+    return answer
 
 
 async def typing_loop(channel):
@@ -109,21 +286,172 @@ async def typing_loop(channel):
         await asyncio.sleep(8)
 
 
-@client.event
+async def download(url: str, headers: dict | None = None):
+    """Yields the body of `url` in pieces without buffering all of it."""
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+    async with http_client.request(
+        "GET", url, headers=headers, timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        async for data in response.content.iter_chunked(64 * 1024):
+            yield data
+
+
+async def transcribe_live(
+    live: LiveText, url: str, headers: dict | None, prompt: str, name: str, owner: str
+) -> str:
+    """
+    Transcribes the audio at `url` as a job in the audio lane, showing the
+    job id while it waits and each finished chunk while it runs.
+
+    :raises JobCancelled: If the job was cancelled.
+    """
+
+    async def run(job: Job) -> str:
+        async def on_progress(progress: TranscriptionProgress):
+            job.detail = progress.status()
+            await live.update(progress.text, f"{job.detail} (ジョブ #{job.id})")
+
+        # ダウンロードしながらffmpegに渡し、元のファイルはディスクに保存しない
+        text = await transcription.transcribe_stream(
+            download(url, headers), prompt, on_progress=on_progress, name=name
+        )
+        await live.update(text, "書き起こしが完了しました:", final=True)
+        return text
+
+    job = job_executor.submit("audio", name, run, owner=owner)
+    await live.update("", f"書き起こし待機中 (ジョブ #{job.id})")
+    try:
+        return await job.result()
+    except JobCancelled:
+        await live.update(
+            "", f"書き起こしをキャンセルしました (ジョブ #{job.id})", final=True
+        )
+        raise
+
+
+async def transcribe_attachment(
+    attachment: discord.Attachment, prompt: str, message: discord.Message, key: str
+) -> str:
+    # 完了したチャンクから順に返信を編集して途中経過を見せる
+    live = sender.live_discord(message)
+    try:
+        return await transcribe_live(
+            live,
+            attachment.url,
+            None,
+            prompt,
+            attachment.filename,
+            str(message.author.id),
+        )
+    finally:
+        # 書き起こしへの返信も同じ会話として続けられるようにする
+        for reply in live.handles:
+            conversations.link(reply.id, key)
+
+
+async def list_open_issues() -> str:
+    issues = await github_api.open_issues(REPO_NAME)
+    issues_list = []
+    for issue in issues:
+        issues_list.append(
+            f"Issue#{issue['number']}: {issue['title']} - URL: {issue['html_url']}"
+        )
+    return (
+        "\n".join(issues_list) if issues_list else "現在オープンなIssueはありません。"
+    )
+
+
+def stats_reply() -> str:
+    lines = [f"ChatGPT: {chat_cache.summary()}", f"GitHub: {github_api.summary()}"]
+    if transcription.cache is not None:
+        cache = transcription.cache
+        lines.append(
+            f"文字起こしキャッシュ: ヒット {cache.hits}件, ミス {cache.misses}件"
+        )
+    return "\n".join(lines)
+
+
+def job_command_reply(command: str, owner: str) -> str | None:
+    """
+    Answers "job status", "job status <id>" and "job cancel <id>"; returns
+    None for any other text.
+    """
+    words = command.lower().split()
+    if len(words) < 2 or words[0] != "job" or words[1] not in ("status", "cancel"):
+        return None
+    job_id = words[2].lstrip("#") if len(words) > 2 else ""
+    if words[1] == "status" and not job_id:
+        lines = [job.describe() for job in job_executor.active()]
+        return "\n".join(lines) if lines else "実行中のジョブはありません。"
+    job = job_executor.get(int(job_id)) if job_id.isdigit() else None
+    if job is None:
+        return "指定したジョブが見つかりません。"
+    if words[1] == "status":
+        return job.describe()
+    if job.owner != owner:
+        return "他のユーザーのジョブはキャンセルできません。"
+    running_in_process = job.lane == "dev" and job.task is not None
+    if not job_executor.cancel(job.id):
+        return f"ジョブ #{job.id} は既に終了しています。"
+    if running_in_process:
+        # 実行中のプロセスは止められないため、結果を返さないだけになる
+        return (
+            f"ジョブ #{job.id} をキャンセルしました（実行中の処理は完了まで続きます）。"
+        )
+    return f"ジョブ #{job.id} をキャンセルしました。"
+
+
 async def on_ready():
+    global background_started
     logging.info(f"Logged in as {client.user}")
-    if CHECK_URL and CACHE_FILE and CHANNEL_ID:
-        client.loop.create_task(check_website())
+    # 再接続時にも呼ばれるため、バックグラウンド処理は一度だけ起動する
+    if background_started:
+        return
+    background_started = True
+    client.loop.create_task(outbox.run())
+    targets = watch_targets
+    if targets:
+        store = SnapshotStore(STATE_DB, retention_days=SNAPSHOT_RETENTION_DAYS)
+        watcher = SiteWatcher(
+            targets,
+            notify_site_update,
+            store,
+            max_concurrency=MAX_CONCURRENT_FETCHES,
+            max_per_host=MAX_FETCHES_PER_HOST,
+            max_seen_entries=MAX_SEEN_ENTRIES,
+            scheduler=PollScheduler(
+                error_base=ERROR_BACKOFF_BASE, error_cap=ERROR_INTERVAL
+            ),
+            # 失敗時の再試行はPollSchedulerが間隔を調整して行う
+            session=http_client.session,
+        )
+        client.loop.create_task(watcher.run())
     else:
         logging.info(
-            "CHECK_URLまたはCACHE_FILEまたはCHANNEL_IDが設定されていないため、サイトチェックをスキップします。"
+            "監視対象のサイトが設定されていないため、サイトチェックをスキップします。"
         )
 
 
-conversation_history = [{"role": "system", "content": SYSTEM_PROMPT}]
+# 返信チェーンやスレッドごとに履歴を分け、トークン数の上限に収まるよう古い発言から削る
+conversations = ConversationStore(
+    SYSTEM_PROMPT,
+    token_budget=CONVERSATION_TOKEN_BUDGET,
+    max_conversations=MAX_CONVERSATIONS,
+    max_total_tokens=CONVERSATION_MEMORY_TOKENS,
+)
+
+
+def conversation_key(message: discord.Message) -> str:
+    if message.reference and message.reference.message_id:
+        replied_id = message.reference.message_id
+        return conversations.key_for(replied_id) or f"message:{replied_id}"
+    if isinstance(message.channel, discord.Thread):
+        return f"thread:{message.channel.id}"
+    # 返信でない発言は新しい会話を始める
+    return f"message:{message.id}"
 
 
-@client.event
 async def on_message(message):
     if message.author == client.user:
         return
@@ -131,14 +459,30 @@ async def on_message(message):
     # Dev mode用のチェック
     if PAT and "Dev mode" in message.content and client.user in message.mentions:
         dev_command = message.content.replace("Dev mode", "").strip()
+        # ブランチ作成やGPT呼び出しを含む重い処理は別プロセスで実行する
+        job = job_executor.submit(
+            "dev",
+            "Dev mode",
+            lambda job: job_executor.run_in_process(
+                handle_dev_message_sync, dev_command
+            ),
+            owner=str(message.author.id),
+        )
+        await message.reply(f"ジョブ #{job.id} として受け付けました。")
         typing_task = asyncio.create_task(typing_loop(message.channel))
-        reply_text = await asyncio.to_thread(handle_dev_message_sync, dev_command)
-        typing_task.cancel()
         try:
-            await typing_task
-        except asyncio.CancelledError:
-            pass
-        await message.reply(reply_text)
+            reply_text = await job.result()
+        except JobCancelled:
+            return
+        except Exception as e:
+            reply_text = f"Dev modeの処理に失敗しました: {e}"
+        finally:
+            typing_task.cancel()
+            try:
+                await typing_task
+            except asyncio.CancelledError:
+                pass
+        await sender.reply_discord(message, reply_text)
         return
 
     # Issue mode用のチェック
@@ -150,8 +494,16 @@ async def on_message(message):
         try:
             from .issue_handler import create_issue
 
-            issue_result = await asyncio.to_thread(create_issue, issue_content)
+            job = job_executor.submit(
+                "dev",
+                "Issue mode",
+                lambda job: asyncio.to_thread(create_issue, issue_content),
+                owner=str(message.author.id),
+            )
+            issue_result = await job.result()
             await message.reply(issue_result)
+        except JobCancelled:
+            pass
         except Exception as e:
             logging.error(f"Issue作成中にエラーが発生しました: {e}")
             await message.reply("Issueの作成に失敗しました。")
@@ -182,262 +534,262 @@ async def on_message(message):
         if not prompt and not audio_files:
             await message.reply("何か質問してにゃ。")
             return
+        job_reply = job_command_reply(prompt, str(message.author.id))
+        if job_reply is not None:
+            await sender.reply_discord(message, job_reply)
+            return
+        if prompt.lower() == "stats":
+            await sender.reply_discord(message, stats_reply())
+            return
         if prompt.lower() == "check issue":
             try:
-                g = Github(PAT)
-                repo = g.get_repo(config.REPO_NAME)
-                issues = repo.get_issues(state="open")
-                issues_list = []
-                for issue in issues:
-                    issues_list.append(
-                        f"Issue#{issue.number}: {issue.title} - URL: {issue.html_url}"
-                    )
-                reply_text = (
-                    "\n".join(issues_list)
-                    if issues_list
-                    else "現在オープンなIssueはありません。"
+                job = job_executor.submit(
+                    "dev",
+                    "check issue",
+                    lambda job: list_open_issues(),
+                    owner=str(message.author.id),
                 )
-                await message.reply(reply_text)
+                reply_text = await job.result()
+                await sender.reply_discord(message, reply_text)
+            except JobCancelled:
+                pass
             except Exception as e:
                 logging.error(f"Issue取得中にエラー発生: {e}")
                 await message.reply("Issueの取得に失敗しました。")
             return
-        if message.reference:
-            if message.author.bot:
-                rounds = (len(conversation_history) - 1) // 2
-                if rounds >= 3:
-                    return
-            conversation_history.append({"role": "user", "content": prompt})
-        else:
-            conversation_history.clear()
-            conversation_history.append({"role": "system", "content": SYSTEM_PROMPT})
-            conversation_history.append({"role": "user", "content": prompt})
+        key = conversation_key(message)
+        if message.author.bot and conversations.get(key).turns >= 3:
+            return
+        conversations.append(key, "user", prompt)
+        conversations.link(message.id, key)
         typing_task = asyncio.create_task(typing_loop(message.channel))
 
+        replied = False
+        cancelled = False
         if audio_files:
+            # 添付ファイルごとの文字起こしを並行して行う
+            results = await asyncio.gather(
+                *(transcribe_attachment(a, prompt, message, key) for a in audio_files),
+                return_exceptions=True,
+            )
             transcriptions = []
-            for audio_file in audio_files:
-                try:
-                    with tempfile.NamedTemporaryFile(
-                        suffix=".m4a", delete=False
-                    ) as tmp_file:
-                        tmp_file_path = tmp_file.name
-                        await audio_file.save(tmp_file_path)
-
-                    chunk_paths = split_audio_with_overlap(
-                        tmp_file_path,
-                        output_dir="audio_chunks",
+            for result in results:
+                if isinstance(result, JobCancelled):
+                    continue  # キャンセルされたことは返信に表示済み
+                if isinstance(result, Exception):
+                    logging.error(f"Failed to process audio file: {result}")
+                    await message.reply(
+                        f"音声ファイルの処理に失敗しました: {str(result)}"
                     )
+                else:
+                    transcriptions.append(result)
 
-                    transcriptions = []
-                    previous_transcription = ""  # 前のチャンクの文字起こし内容
-
-                    for i, cp in enumerate(chunk_paths):
-                        logging.info(
-                            f"チャンク {i+1}/{len(chunk_paths)} の文字起こしを開始: {cp}"
-                        )
-
-                        # 前のチャンクの文字起こし内容をプロンプトに追加
-                        current_context = prompt
-                        if previous_transcription:
-                            prompt_prefix = f"{prompt}\n\n"
-                            current_context = prompt_prefix + previous_transcription
-                            logging.info("前のチャンクの内容をプロンプトに追加しました")
-
-                        # 文字起こし実行
-                        text = asyncio.run(
-                            transcribe_audio(cp, context=current_context)
-                        )
-                        transcriptions.append(text)
-
-                        # 次のチャンク用に現在の文字起こし内容を保存
-                        previous_transcription = text
-
-                        logging.info(
-                            f"チャンク {i+1}/{len(chunk_paths)} の文字起こし完了"
-                        )
-
-                    final_result = "\n".join(transcriptions)
-                    reply_text = f"書き起こしが完了しました:\n{final_result}"
-                except Exception as e:
-                    logging.error(f"Failed to process audio file: {e}")
-                    await message.reply(f"音声ファイルの処理に失敗しました: {str(e)}")
-
-            # If any audio files were found, reply with the final transcription
-            if transcriptions:
-                final_result = "\n".join(transcriptions)
-                reply_text = f"書き起こしが完了しました:\n{final_result}"
+            # 書き起こしは途中経過と共に送信済みなので、履歴にだけ残す
+            final_result = "\n".join(transcriptions)
+            reply_text = f"書き起こしが完了しました:\n{final_result}"
         else:
-            reply_text = await call_chatgpt_with_history(conversation_history)
+            messages = conversations.messages(key)
+            # ストリーミング時は生成された分から返信に表示し、書き終わるまで編集していく
+            job = job_executor.submit(
+                "chat",
+                "ChatGPT",
+                lambda job: (
+                    reply_chatgpt_streaming(message, messages, key)
+                    if CHAT_STREAMING
+                    else call_chatgpt_with_history(messages)
+                ),
+                owner=str(message.author.id),
+            )
+            try:
+                reply_text = await job.result()
+                replied = CHAT_STREAMING
+            except JobCancelled:
+                cancelled = True
+                reply_text = "応答の生成をキャンセルしました。"
         typing_task.cancel()
         try:
             await typing_task
         except asyncio.CancelledError:
             pass
-        conversation_history.append({"role": "assistant", "content": reply_text})
-        await message.reply(reply_text)
+        if audio_files and not transcriptions:
+            return
+        # キャンセルの通知は会話の一部ではないため、履歴には残さない
+        if not cancelled:
+            conversations.append(key, "assistant", reply_text)
+        if not audio_files and not replied:
+            for reply in await sender.reply_discord(message, reply_text):
+                conversations.link(reply.id, key)
         return
     if GREETINGS and HEALTH_CHECK_GREETING in message.content.lower():
         await message.channel.send(random.choice(GREETINGS))
 
 
-async def check_website():
-    global previous_content
-    async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                content = await fetch_site_content(session, CHECK_URL)
-                if previous_content is None:
-                    previous_content = content
-                    update_cache(content)
-                    logging.info("初回チェック完了。キャッシュファイルに保存しました。")
-                else:
-                    old_list = extract_titles(previous_content)
-                    new_list = extract_titles(content)
-                    added_entries = [item for item in new_list if item not in old_list]
-                    if added_entries:
-                        channel = client.get_channel(CHANNEL_ID)
-                        if channel:
-                            formatted_list = []
-                            for url, title in added_entries:
-                                formatted_list.append(f"タイトル: {title}\nURL: {url}")
-                            titles_text = "\n\n".join(formatted_list)
-                            message_to_send = SITE_UPDATE_MESSAGE.format(
-                                titles_text=titles_text
-                            )
-                            await channel.send(message_to_send)
-                            logging.info(
-                                "更新を検知し、以下の内容で通知を送信しました:"
-                            )
-                            logging.info(titles_text)
-                        else:
-                            logging.error("指定したチャンネルが見つかりません。")
-                        previous_content = content
-                        update_cache(content)
-                    else:
-                        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        logging.info(
-                            f"更新は検知されませんでした。 現在の時刻: {current_time}"
-                        )
-                await asyncio.sleep(CHECK_INTERVAL)
-            except Exception as e:
-                logging.error(f"エラーが発生しました: {e}")
-                await asyncio.sleep(ERROR_INTERVAL)
-
-
-if bot_token:
-    slack_app = App(token=bot_token)
-    logging.info("Slack 初期化")
-
-    @slack_app.event("message")
-    def handle_message_events(body: dict[str, Any], logger: logging.Logger) -> None:
-        logging.info("メッセージ受信")
-        event = body.get("event", {})
-        message_text = event.get("text", "")
-        channel_id = event.get("channel", "")
-        ts = event.get("ts", "")
-        files = event.get("files", [])
-        for file_info in files:
-            if file_info.get("mimetype", "").startswith("audio/"):
-                audio_url = file_info.get("url_private_download")
-                headers = {"Authorization": f"Bearer {bot_token}"}
-                try:
-                    logger.info(f"音声ファイルのダウンロードを開始: {audio_url}")
-                    # タイムアウト設定を追加 (60秒)
-                    response = requests.get(
-                        audio_url, headers=headers, timeout=60, stream=True
-                    )
-                    response.raise_for_status()
-
-                    # 一時ファイルを作成
-                    with tempfile.NamedTemporaryFile(
-                        suffix=".m4a", delete=False
-                    ) as tmp_file:
-                        logger.info(f"一時ファイルに保存中: {tmp_file.name}")
-                        # 大きなファイルを効率的に処理するためにチャンクで書き込み
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                tmp_file.write(chunk)
-                        tmp_file_path = tmp_file.name
-
-                    logger.info(
-                        f"ダウンロード完了、音声分割処理を開始: {tmp_file_path}"
-                    )
-                    # ファイルを分割
-                    chunk_paths = split_audio_with_overlap(
-                        tmp_file_path,
-                        output_dir="audio_chunks",
-                    )
-
-                    logger.info(
-                        f"音声分割完了、{len(chunk_paths)}個のチャンクを処理します"
-                    )
-                    transcriptions = []
-                    previous_transcription = ""  # 前のチャンクの文字起こし内容
-
-                    for i, cp in enumerate(chunk_paths):
-                        logging.info(
-                            f"チャンク {i+1}/{len(chunk_paths)} の文字起こしを開始: {cp}"
-                        )
-
-                        # 前のチャンクの文字起こし内容をプロンプトに追加
-                        current_context = message_text
-                        if previous_transcription:
-                            prompt_prefix = f"{message_text}\n\n"
-                            current_context = prompt_prefix + previous_transcription
-                            logging.info("前のチャンクの内容をプロンプトに追加しました")
-
-                        # 文字起こし実行
-                        text = asyncio.run(
-                            transcribe_audio(cp, context=current_context)
-                        )
-                        transcriptions.append(text)
-
-                        # 次のチャンク用に現在の文字起こし内容を保存
-                        previous_transcription = text
-
-                        logging.info(
-                            f"チャンク {i+1}/{len(chunk_paths)} の文字起こし完了"
-                        )
-
-                    final_result = "\n".join(transcriptions)
-                    logger.info(f"Audio file processed and split: {tmp_file_path}")
-                    logger.info(f"Final transcription:\n{final_result}")
-
-                    # Post a Slack reply in the thread where the audio was posted
-                    slack_app.client.chat_postMessage(
-                        channel=channel_id,
-                        text=f"書き起こしが完了しました:\n{final_result}",
-                        thread_ts=ts,
-                    )
+# 再送されたイベントを二重に処理しないよう、処理済みのIDを覚えておく
+slack_events = RecentKeys(ttl=SLACK_EVENT_TTL)
+
+
+async def send_slack(channel: str, text: str):
+    await sender.send_slack(slack_app.client, channel, text)
+
+
+async def transcribe_slack_audio(
+    file_info: dict[str, Any],
+    message_text: str,
+    channel_id: str,
+    ts: str,
+    user: str,
+):
+    audio_url = file_info.get("url_private_download", "")
+    headers = {"Authorization": f"Bearer {bot_token}"}
+    logging.info(f"音声ファイルのダウンロードを開始: {audio_url}")
+    # Post a Slack reply in the thread where the audio was posted,
+    # edited as each chunk is transcribed
+    live = sender.live_slack(slack_app.client, channel_id, thread_ts=ts)
+    final_result = await transcribe_live(
+        live,
+        audio_url,
+        headers,
+        message_text,
+        file_info.get("name", "audio"),
+        f"slack:{user}",
+    )
+    logging.info(f"Final transcription:\n{final_result}")
+
+
+async def handle_message_events(
+    ack, body: dict[str, Any], logger: logging.Logger
+) -> None:
+    # 3秒以内に応答しないと再送されるため、処理より先に受信を確認する
+    await ack()
+    event = body.get("event", {})
+    if event.get("bot_id"):
+        return  # 自分の返信やファイル添付には反応しない
+    keys = [body.get("event_id"), event.get("client_msg_id")]
+    keys = [key for key in keys if key]
+    if any(key in slack_events for key in keys):
+        logging.info(f"重複したSlackイベントを無視します: {keys}")
+        return
+    for key in keys:
+        slack_events.add(key)
+    logging.info("メッセージ受信")
+    message_text = event.get("text", "")
+    channel_id = event.get("channel", "")
+    ts = event.get("ts", "")
+    user = event.get("user", "")
+    files = event.get("files", [])
+    jobs = []
+    for file_info in files:
+        if file_info.get("mimetype", "").startswith("audio/"):
+            # 複数の添付ファイルを並行して処理する
+            jobs.append(
+                transcribe_slack_audio(file_info, message_text, channel_id, ts, user)
+            )
+        else:
+            logger.info("No audio files attached in the Slack message.")
+            await slack_app.client.chat_postMessage(
+                channel=channel_id,
+                text="添付されている音声ファイルが見つかりませんでした。",
+                thread_ts=ts,
+            )
 
-                except Exception as e:
-                    logger.error(f"Failed to process audio file: {e}")
-            else:
-                logger.info("No audio files attached in the Slack message.")
-                slack_app.client.chat_postMessage(
-                    channel=channel_id,
-                    text="添付されている音声ファイルが見つかりませんでした。",
-                    thread_ts=ts,
-                )
+    for result in await asyncio.gather(*jobs, return_exceptions=True):
+        if isinstance(result, Exception) and not isinstance(result, JobCancelled):
+            logger.error(f"Failed to process audio file: {result}")
 
-        if not files:
-            logger.info("No files attached in the Slack message.")
+    if not files:
+        logger.info("No files attached in the Slack message.")
 
 
 async def start_slack():
-    handler = SocketModeHandler(slack_app, app_token)
+    # Web APIの呼び出しもダウンロードと同じセッションで行う
+    slack_app.client.session = http_client.session
+    handler = AsyncSocketModeHandler(slack_app, app_token)
     logging.info("Slack ログイン")
-    await asyncio.to_thread(handler.start)
+    await handler.start_async()
+
+
+def build_transcription_backend() -> TranscriptionBackend:
+    if TRANSCRIBE_BACKEND == "local":
+        return LocalWhisperBackend(
+            LOCAL_WHISPER_MODEL,
+            workers=LOCAL_WHISPER_WORKERS or None,
+            language=LOCAL_WHISPER_LANGUAGE or None,
+        )
+    # 文字起こしはイベントループ上で並行して行うため非同期クライアントを使う
+    return OpenAIBackend(
+        CHATGPT_TOKEN,
+        TRANSCRIBE_MODEL,
+        base_url=TRANSCRIBE_BASE_URL or None,
+        max_retries=HTTP_RETRIES,
+    )
+
+
+def setup():
+    """Creates the clients, pools and stores used by the handlers."""
+    global client, outbox, http_client, github_api, job_executor, transcription
+    global transcription_backend, slack_app
+    client = discord.Client(intents=intents)
+    client.event(on_ready)
+    client.event(on_message)
+    # 更新通知はOutboxに積み、送信先ごとのワーカーが非同期に配信する
+    outbox = Outbox(STATE_DB)
+    outbox.register_sink("discord", send_discord)
+    # OpenAI・Slack・ダウンロード・サイト監視で接続プールを共有し、都度の接続確立を避ける
+    http_client = HttpClient(
+        limit=HTTP_MAX_CONNECTIONS,
+        limit_per_host=HTTP_MAX_PER_HOST,
+        dns_ttl=HTTP_DNS_TTL,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        retries=HTTP_RETRIES,
+    )
+    # GitHubの読み取りはTTL内ならメモリから返し、以降はETagで再検証する
+    github_api = GitHubClient(http_client, PAT, ttl=GITHUB_CACHE_TTL)
+    # 会話・音声・Dev/GitHubを別々のレーンで実行し、重い処理が会話を待たせないようにする
+    job_executor = JobExecutor(
+        {"chat": CHAT_JOB_WORKERS, "audio": AUDIO_JOB_WORKERS, "dev": DEV_JOB_WORKERS},
+        process_workers=JOB_PROCESS_WORKERS,
+    )
+    # 音声は分割しながらアップロードし、同時に文字起こしするチャンク数を制限する。
+    # 同じ音声の再投稿はキャッシュから返す
+    transcription_backend = build_transcription_backend()
+    transcription = TranscriptionPipeline(
+        transcription_backend.transcribe,
+        concurrency=TRANSCRIBE_CONCURRENCY,
+        mode=TRANSCRIBE_MODE,
+        preprocess=AUDIO_PREPROCESS,
+        workspace_root=AUDIO_WORKSPACE_ROOT or None,
+        workspace_quota=AUDIO_WORKSPACE_QUOTA_MB * 1024 * 1024,
+        cache=TranscriptCache(
+            STATE_DB,
+            max_bytes=TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024,
+            max_age_days=TRANSCRIPT_CACHE_DAYS,
+        ),
+        model=transcription_backend.model,
+    )
+    if bot_token:
+        slack_app = AsyncApp(token=bot_token)
+        slack_app.event("message")(handle_message_events)
+        outbox.register_sink("slack", send_slack)
+        logging.info("Slack 初期化")
 
 
 async def main():
+    global watch_targets
+    # 監視設定の誤りは接続する前に起動エラーとして報告する
+    watch_targets = build_watch_targets()
+    setup()
     discord_task = asyncio.create_task(client.start(config.TOKEN))
-    if bot_token:
-        slack_task = asyncio.create_task(start_slack())
-        await asyncio.gather(discord_task, slack_task)
-    else:
-        await discord_task
+    try:
+        if bot_token:
+            slack_task = asyncio.create_task(start_slack())
+            await asyncio.gather(discord_task, slack_task)
+        else:
+            await discord_task
+    finally:
+        job_executor.close()
+        transcription_backend.close()
+        await http_client.close()
 
 
 if __name__ == "__main__":
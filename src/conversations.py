@@ -0,0 +1,127 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# メッセージごとにロール等で加算されるトークン数の目安
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximates the token count of `text` without a tokenizer: about four
+    ASCII characters per token, and one token per other character (kana,
+    kanji, ...), which tends to overestimate slightly.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class Conversation:
+    """
+    The messages of one conversation after the system prompt. `turns`
+    counts the assistant replies, including those trimmed away.
+    """
+
+    messages: list[dict] = field(default_factory=list)
+    tokens: int = 0
+    turns: int = 0
+    message_ids: list[int] = field(default_factory=list)
+
+
+class ConversationStore:
+    """
+    Chat histories keyed by conversation (a reply chain, thread, ...).
+
+    Each history is trimmed from the oldest message so that it fits
+    `token_budget` together with the system prompt; the newest message is
+    always kept. Message ids linked with `link` find their conversation
+    again when someone replies to them. Once more than `max_conversations`
+    are held, or their messages exceed `max_total_tokens` in total, the
+    least recently used conversations are dropped.
+
+    :param token_budget: Upper bound of the estimated prompt tokens.
+    :param max_conversations: Number of conversations kept in memory.
+    :param max_total_tokens: Estimated tokens kept in memory in total.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 4000,
+        max_conversations: int = 1000,
+        max_total_tokens: int = 2_000_000,
+    ):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self.max_total_tokens = max_total_tokens
+        self.total_tokens = 0
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self._keys: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def key_for(self, message_id: int) -> str | None:
+        """Returns the conversation `message_id` was linked to, if kept."""
+        return self._keys.get(message_id)
+
+    def get(self, key: str) -> Conversation:
+        """Returns the conversation for `key`, starting it if needed."""
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = self._conversations[key] = Conversation()
+        self._conversations.move_to_end(key)
+        return conversation
+
+    def link(self, message_id: int, key: str):
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return
+        self._keys[message_id] = key
+        conversation.message_ids.append(message_id)
+
+    def append(self, key: str, role: str, content: str):
+        conversation = self.get(key)
+        message = {"role": role, "content": content}
+        conversation.messages.append(message)
+        tokens = message_tokens(message)
+        conversation.tokens += tokens
+        self.total_tokens += tokens
+        if role == "assistant":
+            conversation.turns += 1
+        self._trim(conversation)
+        self._evict()
+
+    def messages(self, key: str) -> list[dict]:
+        """Returns the prompt for `key`: the system prompt and the history."""
+        return [self.system_message, *self.get(key).messages]
+
+    def _trim(self, conversation: Conversation):
+        budget = self.token_budget - message_tokens(self.system_message)
+        while conversation.tokens > budget and len(conversation.messages) > 1:
+            tokens = message_tokens(conversation.messages.pop(0))
+            conversation.tokens -= tokens
+            self.total_tokens -= tokens
+
+    def _evict(self):
+        evicted = 0
+        # 使用中の会話（末尾）は残す
+        while len(self._conversations) > 1 and (
+            len(self._conversations) > self.max_conversations
+            or self.total_tokens > self.max_total_tokens
+        ):
+            _, conversation = self._conversations.popitem(last=False)
+            self.total_tokens -= conversation.tokens
+            for message_id in conversation.message_ids:
+                self._keys.pop(message_id, None)
+            evicted += 1
+        if evicted:
+            logger.info(f"使われていない会話を{evicted}件破棄しました")
@@ -0,0 +1,43 @@
+import time
+from collections import OrderedDict
+
+
+class RecentKeys:
+    """
+    Keys seen within the last `ttl` seconds, at most `max_keys` of them.
+
+    `add` tells whether a key is new, so redelivered events can be
+    dropped. Keys expire in insertion order, and once `max_keys` is
+    reached the oldest are forgotten early.
+    """
+
+    def __init__(self, ttl: float = 600, max_keys: int = 10000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._expires: OrderedDict[str, float] = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        self._expire(time.monotonic())
+        return key in self._expires
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def add(self, key: str) -> bool:
+        """Records `key`; returns False if it was already recorded."""
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._expires:
+            return False
+        self._expires[key] = now + self.ttl
+        while len(self._expires) > self.max_keys:
+            self._expires.popitem(last=False)
+        return True
+
+    def _expire(self, now: float):
+        # TTLは一定なので、古いものから順に期限切れになる
+        while self._expires:
+            key, expires = next(iter(self._expires.items()))
+            if expires > now:
+                break
+            del self._expires[key]
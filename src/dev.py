@@ -1,12 +1,15 @@
 import json
 import uuid
-import time
 import logging
 import asyncio
-from github import Github
 from openai import OpenAI
 from config import config
-from .github_utils import get_file_from_repo, get_all_file_paths, create_pull_request
+from .github_utils import (
+    create_pull_request,
+    get_all_file_paths,
+    get_file_from_repo,
+    get_repo,
+)
 from github.GithubException import GithubException
 
 PAT = getattr(config, "PAT", "")
@@ -14,9 +17,13 @@ CHATGPT_TOKEN = config.CHATGPT_TOKEN
 REPO_NAME = getattr(config, "REPO_NAME", "")
 FORKED_REPO_NAME = getattr(config, "FORKED_REPO_NAME", "")
 GPT_MODEL = config.GPT_MODEL
+HTTP_RETRIES = getattr(config, "HTTP_RETRIES", 3)
 
 # タイムアウト設定を追加
-client = OpenAI(api_key=CHATGPT_TOKEN, timeout=180.0)  # 3分タイムアウト
+# 429/5xxはSDKがRetry-Afterに従って再試行する
+client = OpenAI(
+    api_key=CHATGPT_TOKEN, timeout=180.0, max_retries=HTTP_RETRIES
+)  # 3分タイムアウト
 
 
 def generate_branch_name(prefix="auto-fix-"):
@@ -30,18 +37,17 @@ async def handle_dev_message(message: str) -> str:
         logging.warning("必要な環境変数が設定されていません。")
         return "環境変数が設定されていません。"
 
-    g = Github(PAT)
     branch_name = generate_branch_name()
     logging.info(f"GitHubブランチ『{branch_name}』を作成しています。")
 
     try:
         # REPO_NAMEのmainブランチの最新コミットSHAを利用して、
         # FORKED_REPO_NAMEにブランチ作成
-        base_repo = g.get_repo(REPO_NAME)
+        base_repo = get_repo(REPO_NAME)
         base_main = base_repo.get_branch("main")
         commit_sha = base_main.commit.sha
 
-        forked_repo = g.get_repo(FORKED_REPO_NAME)
+        forked_repo = get_repo(FORKED_REPO_NAME)
         forked_repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=commit_sha)
         logging.info(f"GitHubブランチ『{branch_name}』の作成に成功しました。")
     except Exception as e:
@@ -178,39 +184,3 @@ async def handle_dev_message(message: str) -> str:
 
 def handle_dev_message_sync(message: str) -> str:
     return asyncio.run(handle_dev_message(message))
-
-
-async def transcribe_audio(audio_file_path: str, context: str) -> str:
-    """
-    Transcribes an audio file using OpenAI's Whisper endpoint,
-        returning the transcribed text.
-
-    :param client: An instance of your OpenAI client.
-    :param audio_file_path: The full path to the local audio file (e.g. .m4a, .wav).
-    :param context: Prompt text or context to help guide the transcription.
-    :return: The transcribed text from Whisper.
-    :raises Exception: If the API call fails or no text is returned.
-    """
-    try:
-        logging.info(f"OpenAI文字起こし処理開始: {audio_file_path}")
-        start_time = time.time()
-
-        with open(audio_file_path, "rb") as audio_file:
-            # Whisper APIを呼び出し（クライアント初期化時にタイムアウトは設定済み）
-            response = client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                prompt=context,
-            )
-
-        elapsed_time = time.time() - start_time
-        logging.info(f"文字起こし完了: 処理時間 {elapsed_time:.2f}秒")
-
-        # Whisper returns a JSON with at least a "text" field
-        return response.text
-    except asyncio.TimeoutError:
-        logging.error(f"文字起こし処理がタイムアウトしました: {audio_file_path}")
-        return "<書き起こしがタイムアウトしました>"
-    except Exception as e:
-        logging.error(f"文字起こし処理でエラーが発生: {str(e)}")
-        return f"<書き起こしに失敗しました: {str(e)}>"
@@ -0,0 +1,45 @@
+from typing import Any, Iterable, Iterator
+
+
+class EntryIndex:
+    """
+    Hashed, insertion-ordered set of the entries seen on one target.
+
+    Membership and diffs are O(1) per entry. Entries are given and returned
+    in page order (newest first); when more than `max_entries` are held the
+    oldest ones are evicted.
+    """
+
+    def __init__(self, entries: Iterable[Any] = (), max_entries: int = 10000):
+        self.max_entries = max_entries
+        # 古い順に保持する（dictの挿入順を利用）
+        self._seen: dict[Any, None] = {}
+        self.add(entries)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, entry: Any) -> bool:
+        return entry in self._seen
+
+    def __iter__(self) -> Iterator[Any]:
+        return reversed(self._seen)
+
+    @property
+    def newest(self) -> Any:
+        return next(reversed(self._seen), None)
+
+    def diff(self, entries: Iterable[Any]) -> list:
+        """Returns the entries not seen yet, in their original order."""
+        added: dict[Any, None] = {}
+        for entry in entries:
+            if entry not in self._seen:
+                added[entry] = None
+        return list(added)
+
+    def add(self, entries: Iterable[Any]):
+        for entry in reversed(list(entries)):
+            self._seen.pop(entry, None)
+            self._seen[entry] = None
+        while len(self._seen) > self.max_entries:
+            del self._seen[next(iter(self._seen))]
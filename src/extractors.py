@@ -0,0 +1,350 @@
+import codecs
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, AsyncIterator, Callable
+
+# 要素の終了タグを持たないHTMLタグ
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+
+TITLE01_PATTERN = r'<h3 class="title01">\s*<a href="([^"]+)">([^<]+)</a>\s*</h3>'
+
+
+class Matcher(ABC):
+    """Incremental matcher created per document by `ExtractionRule.matcher()`."""
+
+    @abstractmethod
+    def feed(self, text: str) -> list:
+        pass
+
+    def close(self) -> list:
+        return []
+
+
+class ExtractionRule(ABC):
+    """A precompiled rule that pulls entries out of an HTML document."""
+
+    @abstractmethod
+    def matcher(self) -> Matcher:
+        pass
+
+    def extract(self, html: str) -> list:
+        matcher = self.matcher()
+        return matcher.feed(html) + matcher.close()
+
+
+class _EventParser(HTMLParser):
+    def __init__(self, matcher: "HTMLMatcher"):
+        super().__init__(convert_charrefs=True)
+        self.matcher = matcher
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        self.matcher.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        self.matcher.handle_endtag(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.matcher.handle_data(data)
+
+
+class HTMLMatcher(Matcher):
+    """
+    Matcher driven by `html.parser` events.
+
+    Subclasses implement the `handle_*` callbacks and append what they find to
+    `entries`, which `feed()` and `close()` hand out and reset.
+    """
+
+    def __init__(self) -> None:
+        self.parser = _EventParser(self)
+        self.entries: list = []
+
+    def feed(self, text: str) -> list:
+        self.parser.feed(text)
+        return self.take()
+
+    def close(self) -> list:
+        self.parser.close()
+        return self.take()
+
+    def take(self) -> list:
+        entries, self.entries = self.entries, []
+        return entries
+
+    def handle_starttag(self, tag: str, attr_list: list) -> None:
+        pass
+
+    def handle_endtag(self, tag: str) -> None:
+        pass
+
+    def handle_data(self, data: str) -> None:
+        pass
+
+
+class _RegexMatcher(Matcher):
+    def __init__(self, rule: "RegexRule"):
+        self.rule = rule
+        self.buffer = ""
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        entries = []
+        end = 0
+        for m in self.rule.pattern.finditer(self.buffer):
+            entries.append(self.rule.entry(m))
+            end = m.end()
+        # マッチしなかった末尾だけを次のチャンクのために残す
+        self.buffer = self.buffer[end:][-self.rule.max_tail :]
+        return entries
+
+
+class RegexRule(ExtractionRule):
+    """
+    Extracts entries with a regular expression, like `re.findall`.
+
+    Chunks are matched as they arrive and only the unmatched tail is kept, so
+    the pattern must be delimited on both sides (a closing tag, a quote...)
+    and no match may be longer than `max_tail` characters.
+    """
+
+    def __init__(self, pattern: str, flags: int = 0, max_tail: int = 65536):
+        self.pattern = re.compile(pattern, flags)
+        self.max_tail = max_tail
+
+    def entry(self, m: re.Match) -> Any:
+        if self.pattern.groups > 1:
+            return m.groups()
+        return m.group(self.pattern.groups)
+
+    def matcher(self) -> Matcher:
+        return _RegexMatcher(self)
+
+    def extract(self, html: str) -> list:
+        return self.pattern.findall(html)
+
+
+@dataclass
+class Step:
+    """One compound selector, e.g. `h3.title01` or `h3[@class="title01"]`."""
+
+    tag: str = "*"
+    classes: set[str] = field(default_factory=set)
+    attrs: dict[str, str | None] = field(default_factory=dict)
+    child: bool = False  # True: 直接の子要素 / False: 子孫要素
+
+    def matches(self, tag: str, attrs: dict[str, str]) -> bool:
+        if self.tag != "*" and self.tag != tag:
+            return False
+        if self.classes and not self.classes <= set(attrs.get("class", "").split()):
+            return False
+        for name, value in self.attrs.items():
+            if name not in attrs or (value is not None and attrs[name] != value):
+                return False
+        return True
+
+
+_CSS_TOKEN = re.compile(r"\s*(>)?\s*([^\s>]+)")
+_CSS_PART = re.compile(
+    r"([.#])([\w-]+)|\[([\w-]+)(?:=[\"']?([^\"'\]]*)[\"']?)?\]|([\w*-]+)"
+)
+_XPATH_STEP = re.compile(r"(//?)([\w*-]+)((?:\[[^\]]*\])*)")
+_XPATH_PREDICATE = re.compile(r"\[@([\w-]+)(?:\s*=\s*[\"']([^\"']*)[\"'])?\]")
+
+
+def parse_css(selector: str) -> list[Step]:
+    """Parses a CSS selector subset: tag, .class, #id, [attr], [attr=v], ' ', '>'."""
+    steps: list[Step] = []
+    for combinator, compound in _CSS_TOKEN.findall(selector):
+        step = Step(child=bool(combinator))
+        for prefix, name, attr, value, tag in _CSS_PART.findall(compound):
+            if prefix == ".":
+                step.classes.add(name)
+            elif prefix == "#":
+                step.attrs["id"] = name
+            elif attr:
+                step.attrs[attr] = value or None
+            else:
+                step.tag = tag.lower()
+        steps.append(step)
+    if not steps:
+        raise ValueError(f"Invalid CSS selector: {selector!r}")
+    return steps
+
+
+def parse_xpath(path: str) -> list[Step]:
+    """Parses an XPath subset: `/` and `//` steps with `[@attr]`/`[@attr="v"]`."""
+    steps: list[Step] = []
+    for axis, tag, predicates in _XPATH_STEP.findall(path):
+        step = Step(tag=tag.lower(), child=axis == "/" and bool(steps))
+        for name, value in _XPATH_PREDICATE.findall(predicates):
+            step.attrs[name] = value if value else None
+        steps.append(step)
+    if not steps:
+        raise ValueError(f"Invalid XPath expression: {path!r}")
+    return steps
+
+
+class _Element:
+    __slots__ = ("tag", "at", "within")
+
+    def __init__(self, tag: str, at: frozenset, within: frozenset):
+        self.tag = tag
+        self.at = at  # この要素でマッチしたステップ番号
+        self.within = within  # この要素と祖先でマッチしたステップ番号
+
+
+_ROOT = _Element("", frozenset(), frozenset())
+
+
+class _SelectorMatcher(HTMLMatcher):
+    def __init__(self, rule: "SelectorRule"):
+        super().__init__()
+        self.rule = rule
+        self.stack: list[_Element] = []
+        self.capture_depth = -1
+        self.capture_url = ""
+        self.capture_text: list[str] = []
+
+    def handle_starttag(self, tag: str, attr_list: list) -> None:
+        attrs = {k: v or "" for k, v in attr_list}
+        if self.capture_depth >= 0 and not self.capture_url:
+            self.capture_url = attrs.get(self.rule.url_attr, "")
+        if tag in VOID_ELEMENTS:
+            return
+        parent = self.stack[-1] if self.stack else _ROOT
+        steps = self.rule.steps
+        at = frozenset(
+            i
+            for i, step in enumerate(steps)
+            if step.matches(tag, attrs)
+            and (i == 0 or (i - 1) in (parent.at if step.child else parent.within))
+        )
+        self.stack.append(_Element(tag, at, parent.within | at))
+        if self.capture_depth < 0 and len(steps) - 1 in at:
+            self.capture_depth = len(self.stack)
+            self.capture_url = attrs.get(self.rule.url_attr, "")
+            self.capture_text = []
+
+    def handle_endtag(self, tag: str) -> None:
+        for depth in range(len(self.stack), 0, -1):
+            if self.stack[depth - 1].tag == tag:
+                break
+        else:
+            return
+        if 0 <= self.capture_depth and depth <= self.capture_depth:
+            title = " ".join("".join(self.capture_text).split())
+            self.entries.append((self.capture_url, title))
+            self.capture_depth = -1
+        del self.stack[depth - 1 :]
+
+    def handle_data(self, data: str) -> None:
+        if self.capture_depth >= 0:
+            self.capture_text.append(data)
+
+
+class SelectorRule(ExtractionRule):
+    """
+    Extracts `(url, title)` entries for every element matching `steps`.
+
+    The title is the element's whitespace-normalized text and the url is its
+    `url_attr` attribute, or that of its first descendant which has one.
+    """
+
+    def __init__(self, steps: list[Step], url_attr: str = "href"):
+        self.steps = steps
+        self.url_attr = url_attr
+
+    def matcher(self) -> Matcher:
+        return _SelectorMatcher(self)
+
+
+PRESETS: dict[str, Callable[[], ExtractionRule]] = {
+    "title01": lambda: RegexRule(TITLE01_PATTERN),
+}
+
+
+def compile_rule(spec: str | dict) -> ExtractionRule:
+    """
+    Builds a rule from a target's `extractor` setting.
+
+    :param spec: A preset name, or a dict with `type` set to `regex`
+        (`pattern`, capturing the URL and then the title), `css`
+        (`selector`) or `xpath` (`path`), plus an optional `url_attr` for
+        the selector types, or to `sections` for generic pages (see
+        `SectionRule`).
+    """
+    if isinstance(spec, str):
+        if spec not in PRESETS:
+            raise ValueError(f"Unknown extractor: {spec}")
+        return PRESETS[spec]()
+    kind = spec.get("type", "regex")
+    if kind == "regex":
+        try:
+            rule = RegexRule(spec["pattern"])
+        except re.error as e:
+            raise ValueError(f"Invalid extractor pattern: {e}") from e
+        # 通知は (URL, タイトル) の組を前提にしている
+        if rule.pattern.groups != 2:
+            raise ValueError(
+                "Extractor pattern must have exactly 2 capture groups "
+                f"(URL, title), got {rule.pattern.groups}: {spec['pattern']!r}"
+            )
+        return rule
+    if kind == "css":
+        return SelectorRule(parse_css(spec["selector"]), spec.get("url_attr", "href"))
+    if kind == "xpath":
+        return SelectorRule(parse_xpath(spec["path"]), spec.get("url_attr", "href"))
+    if kind == "sections":
+        from .sections import SectionRule
+
+        return SectionRule(spec.get("max_sections", 500))
+    raise ValueError(f"Unknown extractor type: {kind}")
+
+
+async def extract_stream(
+    chunks: AsyncIterator[bytes],
+    rule: ExtractionRule,
+    encoding: str = "utf-8",
+    stop_at: Any = None,
+    on_chunk: Callable[[bytes], Any] | None = None,
+) -> tuple[list, bool]:
+    """
+    Extracts entries from a stream of raw chunks, e.g. `iter_chunked()`.
+
+    Reading stops as soon as `stop_at` is extracted, so on a newest-first
+    listing only the part above the last known entry is downloaded.
+
+    :return: The entries before `stop_at`, and whether the stream was cut
+        short because `stop_at` was found.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    matcher = rule.matcher()
+    entries: list = []
+    async for chunk in chunks:
+        if on_chunk:
+            on_chunk(chunk)
+        for entry in matcher.feed(decoder.decode(chunk)):
+            if stop_at is not None and entry == stop_at:
+                return entries, True
+            entries.append(entry)
+    for entry in matcher.feed(decoder.decode(b"", final=True)) + matcher.close():
+        if stop_at is not None and entry == stop_at:
+            return entries, True
+        entries.append(entry)
+    return entries, False
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import aiohttp
+
+from .http_client import response_encoding
+
+logger = logging.getLogger(__name__)
+
+FEED_TYPES = {"application/rss+xml", "application/atom+xml"}
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element: ET.Element, *names: str) -> str:
+    for child in element:
+        if _local(child.tag) in names:
+            return (child.text or child.get("href") or "").strip()
+    return ""
+
+
+def feed_signature(data: bytes, page_url: str = "") -> str:
+    """
+    Returns a digest that changes whenever the feed announces an update.
+
+    RSS and Atom are reduced to the id and date of every item; sitemaps to
+    the `lastmod` of `page_url` when listed, otherwise of every URL.
+    """
+    root = ET.fromstring(data)
+    kind = _local(root.tag)
+    parts = []
+    if kind in ("urlset", "sitemapindex"):
+        for url in root:
+            loc = _child_text(url, "loc")
+            lastmod = _child_text(url, "lastmod")
+            if page_url and loc == page_url:
+                parts = [loc, lastmod]
+                break
+            parts += [loc, lastmod]
+    else:
+        for element in root.iter():
+            if _local(element.tag) in ("item", "entry"):
+                parts.append(_child_text(element, "guid", "id", "link"))
+                parts.append(_child_text(element, "pubDate", "updated", "published"))
+        if not parts:
+            parts.append(_child_text(root, "lastBuildDate", "updated"))
+    return hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class _FeedLinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.href = ""
+        self.done = False
+
+    def handle_starttag(self, tag: str, attr_list: list) -> None:
+        attrs = {k: v or "" for k, v in attr_list}
+        if (
+            tag == "link"
+            and not self.href
+            and "alternate" in attrs.get("rel", "").lower().split()
+            and attrs.get("type", "").lower() in FEED_TYPES
+        ):
+            self.href = attrs.get("href", "")
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "head":
+            self.done = True
+
+
+async def discover_feed(session: aiohttp.ClientSession, page_url: str) -> str:
+    """
+    Returns the feed URL advertised by `<link rel="alternate">` on the page,
+    or "" if there is none. Only the `<head>` of the page is downloaded.
+    """
+    parser = _FeedLinkParser()
+    async with session.get(page_url) as response:
+        response.raise_for_status()
+        encoding = response_encoding(response)
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            parser.feed(chunk.decode(encoding, errors="replace"))
+            if parser.href or parser.done:
+                break
+    return urljoin(page_url, parser.href) if parser.href else ""
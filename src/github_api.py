@@ -0,0 +1,111 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlencode
+
+from .http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.github.com"
+
+
+@dataclass
+class _Entry:
+    etag: str
+    data: Any
+    next_url: str | None
+    fetched_at: float
+
+
+class GitHubClient:
+    """
+    Read access to GitHub's REST API over the shared `HttpClient`.
+
+    Responses are kept per URL together with their ETag. Within `ttl`
+    seconds a repeated read is answered from memory without a request;
+    after that it is revalidated with `If-None-Match`, and a 304, which
+    GitHub does not count against the rate limit, reuses the stored body.
+    At most `max_entries` responses are kept, least recently used first
+    out.
+
+    :param token: Personal access token, or "" for anonymous access.
+    :param ttl: Seconds a response is used without revalidating it.
+    """
+
+    def __init__(
+        self,
+        http: HttpClient,
+        token: str = "",
+        ttl: float = 60,
+        max_entries: int = 256,
+        base_url: str = API_URL,
+    ):
+        self.http = http
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.cache_hits = 0
+        self.not_modified = 0
+        self.fetched = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def summary(self) -> str:
+        return (
+            f"キャッシュ {self.cache_hits}件, 304 {self.not_modified}件, "
+            f"取得 {self.fetched}件"
+        )
+
+    async def get(self, url: str) -> tuple[Any, str | None]:
+        """Returns the decoded body of `url` and the next page's URL."""
+        now = time.monotonic()
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+            if now - entry.fetched_at < self.ttl:
+                self.cache_hits += 1
+                return entry.data, entry.next_url
+        headers = dict(self.headers)
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        async with self.http.request("GET", url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                self.not_modified += 1
+                entry.fetched_at = now
+                return entry.data, entry.next_url
+            response.raise_for_status()
+            data = await response.json()
+            next_link = response.links.get("next")
+            entry = _Entry(
+                response.headers.get("ETag", ""),
+                data,
+                str(next_link["url"]) if next_link else None,
+                now,
+            )
+        self.fetched += 1
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry.data, entry.next_url
+
+    async def get_all(self, path: str, **params) -> list:
+        """Follows the `Link` headers of a list endpoint and joins the pages."""
+        url: str | None = f"{self.base_url}{path}?{urlencode(params)}"
+        items: list = []
+        while url is not None:
+            page, url = await self.get(url)
+            items.extend(page)
+        return items
+
+    async def open_issues(self, repo: str) -> list[dict]:
+        """Open issues of `repo` ("owner/name"), pull requests included."""
+        return await self.get_all(f"/repos/{repo}/issues", state="open", per_page=100)
@@ -1,10 +1,35 @@
-from github import Github
+from functools import lru_cache
+
+from github import Github, GithubRetry
 from github.ContentFile import ContentFile
+from github.Repository import Repository
 from config import config
 
 PAT = getattr(config, "PAT", "")
 FORKED_REPO_NAME = getattr(config, "FORKED_REPO_NAME", "")
 REPO_NAME = getattr(config, "REPO_NAME", "")
+HTTP_RETRIES = getattr(config, "HTTP_RETRIES", 3)
+HTTP_MAX_PER_HOST = getattr(config, "HTTP_MAX_PER_HOST", 16)
+
+
+@lru_cache(maxsize=None)
+def get_github(token: str = PAT) -> Github:
+    """
+    Returns a `Github` client shared within the process, so its
+    keep-alive connection pool is reused. `GithubRetry` retries rate-limit
+    and 5xx responses with backoff, waiting for `Retry-After` when given.
+    """
+    retry = GithubRetry(total=HTTP_RETRIES)
+    return Github(token, retry=retry, pool_size=HTTP_MAX_PER_HOST)
+
+
+@lru_cache(maxsize=None)
+def get_repo(name: str, token: str = PAT) -> Repository:
+    """
+    Returns a lazy handle of the repository `name`, memoized per process.
+    Getting it sends no request; attributes are fetched when first used.
+    """
+    return get_github(token).get_repo(name, lazy=True)
 
 
 def get_file_from_repo(file_path: str, branch: str = "main") -> ContentFile | None:
@@ -12,8 +37,7 @@ def get_file_from_repo(file_path: str, branch: str = "main") -> ContentFile | No
         return None
 
     try:
-        g = Github(PAT)
-        repo = g.get_repo(FORKED_REPO_NAME)
+        repo = get_repo(FORKED_REPO_NAME)
         content = repo.get_contents(file_path, ref=branch)
 
         if isinstance(content, list):
@@ -32,8 +56,7 @@ def get_files_from_repo(
         return None
 
     try:
-        g = Github(PAT)
-        repo = g.get_repo(FORKED_REPO_NAME)
+        repo = get_repo(FORKED_REPO_NAME)
         list = repo.get_contents(file_path, ref=branch)
 
         if isinstance(list, ContentFile):
@@ -62,12 +85,10 @@ def get_all_file_paths(directory: str = "src", branch: str = "main") -> list[str
 
 
 def create_pull_request(branch_name: str, pr_title: str, pr_body: str = "") -> str:
-    g = Github(PAT)
-
     try:
-        base_repo = g.get_repo(REPO_NAME)
+        base_repo = get_repo(REPO_NAME)
 
-        forked_repo = g.get_repo(FORKED_REPO_NAME)
+        forked_repo = get_repo(FORKED_REPO_NAME)
 
         pr = base_repo.create_pull(
             title=pr_title,
@@ -0,0 +1,151 @@
+import asyncio
+import codecs
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiohttp
+
+from .scheduler import backoff_delay, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# 一時的な失敗として再試行するステータス
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HttpClient:
+    """
+    The process-wide HTTP connection pool and retry policy.
+
+    All callers share one `aiohttp.ClientSession`, so connections are kept
+    alive and reused per host, DNS lookups are cached for `dns_ttl`
+    seconds, and the connector bounds the open sockets in total and per
+    host. `request` retries connection errors and 429/5xx responses with
+    jittered exponential backoff, waiting for `Retry-After` instead when
+    the server sends one; a `Retry-After` longer than `retry_cap` returns
+    the response to the caller instead of waiting. Request bodies must be
+    replayable (`json=`, bytes) for retries to resend them.
+
+    :param limit: Maximum open connections in total.
+    :param limit_per_host: Maximum open connections per host.
+    :param connect_timeout: Seconds to establish a connection.
+    :param read_timeout: Seconds to wait for each read from the socket.
+    :param retries: Retries after the first attempt.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 16,
+        dns_ttl: float = 300,
+        keepalive: float = 30,
+        connect_timeout: float = 10,
+        read_timeout: float = 180,
+        retries: int = 3,
+        retry_base: float = 1.0,
+        retry_cap: float = 60.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(
+            total=None, connect=connect_timeout, sock_read=read_timeout
+        )
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # セッションはイベントループ上で作る必要があるため、最初に使うときに作る
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=int(self.dns_ttl),
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    @asynccontextmanager
+    async def request(
+        self, method: str, url: str, retries: int | None = None, **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Sends a request, retrying transient failures, and yields the final
+        response. Keyword arguments go to `ClientSession.request`.
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"{method} {url} に失敗しました: {e}")
+                delay = backoff_delay(attempt + 1, self.retry_base, self.retry_cap)
+            else:
+                retry_delay = self._retry_delay(response, attempt, retries)
+                if retry_delay is None:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+                response.release()
+                logger.warning(f"{method} {url} が{response.status}を返しました")
+                delay = retry_delay
+            logger.warning(f"{delay:.1f}秒後に再試行します ({attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
+
+    def _retry_delay(
+        self, response: aiohttp.ClientResponse, attempt: int, retries: int
+    ) -> float | None:
+        """Seconds to wait before retrying `response`, or None to return it."""
+        if response.status not in RETRY_STATUSES or attempt == retries:
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            return backoff_delay(attempt + 1, self.retry_base, self.retry_cap)
+        return retry_after if retry_after <= self.retry_cap else None
+
+
+def response_encoding(response: aiohttp.ClientResponse, default: str = "utf-8") -> str:
+    """
+    The charset declared in the Content-Type, or `default` if it is missing
+    or unknown. Unlike `get_encoding()` this works before the body is read.
+    """
+    if response.charset:
+        try:
+            return codecs.lookup(response.charset).name
+        except LookupError:
+            pass
+    return default
+
+
+async def iter_sse(response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+    """Yields the `data` of each server-sent event as it arrives."""
+    data: list[str] = []
+    async for raw in response.content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            # 空行でイベントが区切られる
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        name, _, value = line.partition(":")
+        if name == "data":
+            data.append(value.removeprefix(" "))
+    if data:
+        yield "\n".join(data)
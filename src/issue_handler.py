@@ -1,5 +1,5 @@
 import logging
-from github import Github
+from .github_utils import get_repo
 from config import config
 
 
@@ -9,8 +9,7 @@ def create_issue(content: str) -> str:
     if not PAT:
         return "PATが設定されていません。Issueを作成できません。"
     try:
-        g = Github(PAT)
-        repo = g.get_repo(REPO_NAME)
+        repo = get_repo(REPO_NAME, PAT)
         title = "Discord Issue"
         issue = repo.create_issue(title=title, body=content)
         return f"Issueが作成されました: {issue.html_url}"
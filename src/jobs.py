@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from .utils import format_seconds, spawn_pool
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATE_LABELS = {
+    QUEUED: "待機中",
+    RUNNING: "実行中",
+    DONE: "完了",
+    FAILED: "失敗",
+    CANCELLED: "キャンセル済み",
+}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    """
+    One unit of work in a lane. `run` receives the job itself, so it can
+    report what it is doing through `detail`.
+    """
+
+    id: int
+    lane: str
+    name: str
+    owner: str
+    run: Callable[["Job"], Awaitable[Any]]
+    future: asyncio.Future
+    state: str = QUEUED
+    detail: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    finished_at: float | None = None
+    task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    async def result(self) -> Any:
+        """Waits for the job; raises its error, or `JobCancelled`."""
+        # 待っている側がキャンセルされてもジョブ自体は続ける
+        return await asyncio.shield(self.future)
+
+    def describe(self) -> str:
+        start = self.created_at if self.started_at is None else self.started_at
+        elapsed = (self.finished_at or time.monotonic()) - start
+        line = (
+            f"#{self.id} [{self.lane}] {self.name}: "
+            f"{STATE_LABELS[self.state]} ({format_seconds(elapsed)})"
+        )
+        return f"{line} - {self.detail}" if self.detail else line
+
+
+@dataclass
+class Lane:
+    workers: int
+    queue: asyncio.Queue
+    tasks: list[asyncio.Task] = field(default_factory=list)
+
+
+def _consume(future: asyncio.Future):
+    # 結果を誰も待たなかったジョブの例外を未取得の警告にしない
+    if not future.cancelled():
+        future.exception()
+
+
+class JobExecutor:
+    """
+    Runs work in named lanes, each with its own queue and worker limit.
+
+    A job only waits behind jobs of its own lane, so a burst of audio or
+    dev work never delays interactive chat. Every job gets an id for
+    `get` and `cancel`: cancelling a queued job drops it, cancelling a
+    running one cancels its task. Blocking or CPU-heavy steps go through
+    `run_in_process`, a shared pool of spawned processes running at a
+    lower OS priority, so they neither hold the event loop's GIL nor take
+    CPU time from chat. The last `history` finished jobs are kept for
+    status queries.
+
+    :param lanes: Worker count per lane name.
+    :param process_workers: Size of the process pool.
+    :param process_nice: Niceness added to the pool's processes.
+    """
+
+    def __init__(
+        self,
+        lanes: dict[str, int],
+        process_workers: int = 2,
+        process_nice: int = 10,
+        history: int = 100,
+    ):
+        self.lanes = {
+            name: Lane(max(1, workers), asyncio.Queue())
+            for name, workers in lanes.items()
+        }
+        self.process_workers = process_workers
+        self.process_nice = process_nice
+        self.history = history
+        self.jobs: OrderedDict[int, Job] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._pool: ProcessPoolExecutor | None = None
+
+    def submit(
+        self,
+        lane: str,
+        name: str,
+        run: Callable[[Job], Awaitable[Any]],
+        owner: str = "",
+    ) -> Job:
+        """Queues `run` in `lane`. Must be called on the event loop."""
+        job = Job(
+            next(self._ids),
+            lane,
+            name,
+            owner,
+            run,
+            asyncio.get_running_loop().create_future(),
+        )
+        job.future.add_done_callback(_consume)
+        self.jobs[job.id] = job
+        self._forget_old()
+        target = self.lanes[lane]
+        # ワーカーはイベントループ上で最初のジョブが来たときに起動する
+        if not target.tasks:
+            target.tasks = [
+                asyncio.create_task(self._worker(target)) for _ in range(target.workers)
+            ]
+        target.queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: int) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def active(self) -> list[Job]:
+        return [job for job in self.jobs.values() if not job.finished]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a job; returns False if it is unknown or already over."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.task is None:
+            self._finish(job, CANCELLED, error=JobCancelled(f"Job {job_id}"))
+        else:
+            job.task.cancel()
+        logger.info(f"ジョブ #{job_id} のキャンセルを要求しました")
+        return True
+
+    async def run_in_process(self, func: Callable[..., Any], *args) -> Any:
+        """Runs a picklable top-level function in the process pool."""
+        if self._pool is None:
+            self._pool = spawn_pool(self.process_workers, os.nice, (self.process_nice,))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
+
+    def close(self):
+        for lane in self.lanes.values():
+            for task in lane.tasks:
+                task.cancel()
+        for job in self.active():
+            if job.task is not None:
+                job.task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _worker(self, lane: Lane):
+        while True:
+            job = await lane.queue.get()
+            if job.state != QUEUED:
+                continue  # 待機中にキャンセルされた
+            job.state = RUNNING
+            job.started_at = time.monotonic()
+            job.task = asyncio.create_task(job.run(job))
+            # ジョブがキャンセルされてもワーカーは止まらないよう、完了だけを待つ
+            await asyncio.wait({job.task})
+            if job.task.cancelled():
+                self._finish(job, CANCELLED, error=JobCancelled(f"Job {job.id}"))
+            elif (error := job.task.exception()) is not None:
+                logger.error(f"ジョブ #{job.id} ({job.name}) が失敗しました: {error}")
+                self._finish(job, FAILED, error=error)
+            else:
+                self._finish(job, DONE, result=job.task.result())
+
+    def _finish(
+        self,
+        job: Job,
+        state: str,
+        result: Any = None,
+        error: BaseException | None = None,
+    ):
+        job.state = state
+        job.finished_at = time.monotonic()
+        if job.future.done():
+            return
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+        logger.info(f"ジョブ #{job.id} ({job.name}): {STATE_LABELS[state]}")
+
+    def _forget_old(self):
+        excess = len(self.jobs) - self.history
+        if excess <= 0:
+            return
+        old = [job.id for job in self.jobs.values() if job.finished][:excess]
+        for job_id in old:
+            del self.jobs[job_id]
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from .scheduler import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sink TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT NOT NULL DEFAULT '',
+    UNIQUE (sink, destination, key)
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (sink, status, destination, id);
+"""
+
+# 宛先ごとの先頭（最も古い未送信）メッセージ
+HEADS = (
+    "SELECT MIN(id) FROM outbox WHERE sink = ? AND status = 'pending' "
+    "GROUP BY destination"
+)
+
+SendFunc = Callable[[str, str], Awaitable[None]]
+
+
+@dataclass
+class Sink:
+    send: SendFunc
+    concurrency: int
+    wakeup: asyncio.Event
+
+
+class Outbox:
+    """
+    Persistent queue of notifications, delivered by one worker per sink.
+
+    `enqueue` only writes a row, so detection never waits for delivery.
+    Each sink worker sends to several destinations concurrently but keeps
+    the order within one destination, retries failures with jittered
+    backoff, and gives up after `max_attempts`. Messages are deduplicated
+    by `(sink, destination, key)`, and pending rows survive a restart.
+    Sent and failed rows older than `retention_days` are purged every
+    `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 8,
+        retry_base: float = 30,
+        retry_cap: float = 3600,
+        retention_days: float = 7,
+        purge_interval: float = 3600,
+    ):
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.sinks: dict[str, Sink] = {}
+
+    def register_sink(self, name: str, send: SendFunc, concurrency: int = 4):
+        self.sinks[name] = Sink(send, concurrency, asyncio.Event())
+
+    def enqueue(self, sink: str, destination: str, text: str, key: str) -> bool:
+        """Queues a message; returns False if `key` was already queued."""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO outbox "
+            "(sink, destination, key, text, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (sink, destination, key, text, now, now),
+        )
+        if sink in self.sinks:
+            self.sinks[sink].wakeup.set()
+        return cursor.rowcount > 0
+
+    def _due(self, sink: str, limit: int) -> list[tuple[int, str, str, int]]:
+        # 宛先ごとに最も古い未送信メッセージだけを取り出し、送信順を保つ
+        return self.conn.execute(
+            "SELECT id, destination, text, attempts FROM outbox WHERE id IN "
+            f"({HEADS}) AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (sink, time.time(), limit),
+        ).fetchall()
+
+    def _next_attempt_at(self, sink: str) -> float | None:
+        # 先頭以外のメッセージは先頭が送れるまで送らないため、先頭だけを見る
+        row = self.conn.execute(
+            f"SELECT MIN(next_attempt_at) FROM outbox WHERE id IN ({HEADS})",
+            (sink,),
+        ).fetchone()
+        return row[0]
+
+    def purge(self) -> int:
+        """Deletes finished rows older than `retention_days`; returns how many."""
+        cursor = self.conn.execute(
+            "DELETE FROM outbox WHERE status != 'pending' AND created_at < ?",
+            (time.time() - self.retention_days * 86400,),
+        )
+        return cursor.rowcount
+
+    async def run(self):
+        await asyncio.gather(
+            self._purge_loop(), *(self._worker(name) for name in self.sinks)
+        )
+
+    async def _purge_loop(self):
+        while True:
+            if purged := self.purge():
+                logger.info(f"古い通知を{purged}件削除しました")
+            await asyncio.sleep(self.purge_interval)
+
+    async def _worker(self, name: str):
+        sink = self.sinks[name]
+        while True:
+            sink.wakeup.clear()
+            rows = self._due(name, sink.concurrency)
+            if rows:
+                await asyncio.gather(*(self._deliver(name, sink, row) for row in rows))
+                continue
+            next_at = self._next_attempt_at(name)
+            timeout = 60.0 if next_at is None else max(0.0, next_at - time.time())
+            try:
+                await asyncio.wait_for(sink.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, name: str, sink: Sink, row: tuple[int, str, str, int]):
+        message_id, destination, text, attempts = row
+        try:
+            await sink.send(destination, text)
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logger.error(f"[{name}] 通知の送信を断念しました ({destination}): {e}")
+                status, next_at = "failed", time.time()
+            else:
+                delay = backoff_delay(attempts, self.retry_base, self.retry_cap)
+                logger.warning(
+                    f"[{name}] 通知の送信に失敗しました ({destination})。"
+                    f"{delay:.0f}秒後に再試行します: {e}"
+                )
+                status, next_at = "pending", time.time() + delay
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (status, attempts, next_at, str(e), message_id),
+            )
+            return
+        self.conn.execute(
+            "UPDATE outbox SET status = 'sent', attempts = ? WHERE id = ?",
+            (attempts + 1, message_id),
+        )
+        logger.info(f"[{name}] 通知を送信しました ({destination})")
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(model: str, messages: list[dict]) -> str:
+    """
+    Hashes a chat request. Contents are NFKC-normalized and runs of
+    whitespace collapsed, so trivially different spellings share a key.
+    """
+    normalized = [
+        (m["role"], " ".join(unicodedata.normalize("NFKC", m["content"]).split()))
+        for m in messages
+    ]
+    data = json.dumps([model, normalized], ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass
+class _Flight:
+    parts: list[str] = field(default_factory=list)
+    done: bool = False
+    error: BaseException | None = None
+    subscribers: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task | None = None
+
+    def notify(self):
+        # 待っている全員を起こし、次の更新用に新しいイベントに差し替える
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class ResponseCache:
+    """
+    Single-flight coalescing plus an optional TTL/LRU cache of responses.
+
+    Requests with the same key that overlap share one upstream call:
+    later callers replay what has streamed so far and then follow it live.
+    The call is cancelled only when every caller has gone away. With a
+    positive `ttl`, complete responses of `cacheable` requests are kept for
+    `ttl` seconds, at most `max_entries` of them in LRU order. Empty
+    responses and failures are never cached.
+
+    :param ttl: Seconds a response stays cached; 0 disables the cache.
+    :param max_entries: Number of cached responses.
+    """
+
+    def __init__(self, ttl: float = 0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.requests = 0
+        self.hits = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._flights: dict[str, _Flight] = {}
+
+    @property
+    def api_calls(self) -> int:
+        return self.requests - self.hits - self.coalesced
+
+    def summary(self) -> str:
+        saved = self.hits + self.coalesced
+        rate = saved / self.requests * 100 if self.requests else 0.0
+        return (
+            f"リクエスト {self.requests}件, API呼び出し {self.api_calls}件 "
+            f"(節約 {saved}件, ヒット率 {rate:.1f}%: "
+            f"キャッシュ {self.hits}件, 同時リクエストの共有 {self.coalesced}件)"
+        )
+
+    async def stream(
+        self,
+        key: str,
+        source: Callable[[], AsyncGenerator[str, None]],
+        cacheable: bool = False,
+    ) -> AsyncGenerator[str, None]:
+        """Yields the response for `key`, calling `source` only if needed."""
+        self.requests += 1
+        cached = self._get(key) if cacheable else None
+        if cached is not None:
+            self.hits += 1
+            logger.info("キャッシュした応答を返します")
+            yield cached
+            return
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(
+                self._pump(key, flight, source, cacheable)
+            )
+        else:
+            self.coalesced += 1
+            logger.info("実行中の同じリクエストの応答を共有します")
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(flight.parts):
+                    index += 1
+                    yield flight.parts[index - 1]
+                elif flight.done:
+                    break
+                else:
+                    await flight.changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done and flight.task:
+                flight.task.cancel()
+
+    async def call(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[str]],
+        cacheable: bool = False,
+    ) -> str:
+        """Like `stream`, for a response that arrives in one piece."""
+
+        async def source() -> AsyncGenerator[str, None]:
+            if text := await fetch():
+                yield text
+
+        async with aclosing(self.stream(key, source, cacheable)) as parts:
+            return "".join([part async for part in parts])
+
+    async def _pump(
+        self,
+        key: str,
+        flight: _Flight,
+        source: Callable[[], AsyncGenerator[str, None]],
+        cacheable: bool,
+    ):
+        try:
+            async with aclosing(source()) as parts:
+                async for part in parts:
+                    flight.parts.append(part)
+                    flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            del self._flights[key]
+        text = "".join(flight.parts)
+        if cacheable and self.ttl > 0 and flight.error is None and text:
+            self._put(key, text)
+
+    def _get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def _put(self, key: str, text: str):
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
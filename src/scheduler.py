@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Generic, Hashable, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a `Retry-After` header (seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(failures: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter: a random delay in [d/2, d], d <= cap."""
+    delay = min(cap, base * 2 ** max(0, failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+@dataclass
+class PollState:
+    interval: float
+    min_interval: float
+    max_interval: float
+    failures: int = 0
+    last_change: float | None = None
+    change_gap: float | None = None  # 更新間隔の指数移動平均
+
+
+class PollScheduler(Generic[T]):
+    """
+    Priority queue of due times serving many pollers from one loop.
+
+    Each key's interval adapts to how often it actually changes: it is set
+    to half the smoothed gap between observed changes, and grows by
+    `growth` while a key stays unchanged for longer than that gap, always
+    within the key's bounds. Failures back off exponentially with jitter up
+    to `error_cap`, and never retry sooner than a given `Retry-After`.
+    Every delay is jittered by +/-`jitter` and first runs are spread over
+    `spread` seconds, so keys don't fire in bursts.
+    """
+
+    def __init__(
+        self,
+        spread: float = 60,
+        error_base: float = 60,
+        error_cap: float = 86400,
+        jitter: float = 0.1,
+        growth: float = 1.5,
+        smoothing: float = 0.5,
+    ):
+        self.spread = spread
+        self.error_base = error_base
+        self.error_cap = error_cap
+        self.jitter = jitter
+        self.growth = growth
+        self.smoothing = smoothing
+        self.states: dict[T, PollState] = {}
+        self._queue: list[tuple[float, int, T]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def add(self, key: T, interval: float, min_interval: float, max_interval: float):
+        """Registers `key` and schedules its first run within `spread`."""
+        min_interval = min(min_interval, interval)
+        max_interval = max(max_interval, interval)
+        self.states[key] = PollState(interval, min_interval, max_interval)
+        self._push(key, random.uniform(0, min(interval, self.spread)))
+
+    def _push(self, key: T, delay: float):
+        due = time.monotonic() + delay
+        heapq.heappush(self._queue, (due, next(self._counter), key))
+        self._wakeup.set()
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def next_due(self) -> T:
+        """Waits until the earliest key is due, then pops and returns it."""
+        while True:
+            self._wakeup.clear()
+            if not self._queue:
+                await self._wakeup.wait()
+                continue
+            delay = self._queue[0][0] - time.monotonic()
+            if delay <= 0:
+                return heapq.heappop(self._queue)[2]
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def success(self, key: T, changed: bool):
+        state = self.states[key]
+        state.failures = 0
+        now = time.monotonic()
+        if changed:
+            if state.last_change is not None:
+                gap = now - state.last_change
+                state.change_gap = (
+                    gap
+                    if state.change_gap is None
+                    else self.smoothing * gap + (1 - self.smoothing) * state.change_gap
+                )
+                state.interval = state.change_gap / 2
+            state.last_change = now
+        elif (
+            state.change_gap is None
+            or state.last_change is None
+            or now - state.last_change > state.change_gap
+        ):
+            state.interval *= self.growth
+        state.interval = min(
+            state.max_interval, max(state.min_interval, state.interval)
+        )
+        self._push(key, self._jittered(state.interval))
+
+    def failure(self, key: T, retry_after: float | None = None) -> float:
+        """Reschedules `key` after a failure and returns the chosen delay."""
+        state = self.states[key]
+        state.failures += 1
+        delay = backoff_delay(state.failures, self.error_base, self.error_cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self._push(key, delay)
+        return delay
@@ -0,0 +1,135 @@
+import hashlib
+from collections import Counter
+
+from .extractors import ExtractionRule, HTMLMatcher, Matcher
+
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+SKIPPED = {"script", "style", "noscript", "template"}
+MAX_HEADING_LENGTH = 100
+
+
+class _Section:
+    __slots__ = ("anchor", "heading", "digest", "weights", "empty")
+
+    def __init__(self, anchor: str, heading: str):
+        self.anchor = anchor
+        self.heading = heading
+        self.digest = hashlib.blake2b(heading.encode("utf-8"), digest_size=8)
+        self.weights = [0] * 64
+        self.empty = not heading
+
+    def add_text(self, text: str):
+        self.empty = False
+        data = text.encode("utf-8")
+        self.digest.update(data + b"\n")
+        # テキストノード単位でSimHashを更新する
+        h = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+        weights = self.weights
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    def entry(self) -> tuple[str, str, str, str]:
+        simhash = sum(1 << bit for bit, w in enumerate(self.weights) if w > 0)
+        return (self.anchor, self.heading, self.digest.hexdigest(), f"{simhash:016x}")
+
+
+class _SectionMatcher(HTMLMatcher):
+    def __init__(self, rule: "SectionRule"):
+        super().__init__()
+        self.rule = rule
+        self.count = 0
+        self.section: _Section | None = _Section("", "")
+        self.skip_depth = 0
+        self.heading_tag = ""
+        self.heading_id = ""
+        self.heading_text: list[str] = []
+
+    def close(self) -> list:
+        self.parser.close()
+        self._finish()
+        return self.take()
+
+    def _finish(self):
+        if self.section is not None and not self.section.empty:
+            self.entries.append(self.section.entry())
+            self.count += 1
+        self.section = None
+
+    def handle_starttag(self, tag: str, attr_list: list) -> None:
+        if tag in SKIPPED:
+            self.skip_depth += 1
+        elif tag in HEADINGS and not self.heading_tag:
+            self.heading_tag = tag
+            self.heading_id = dict(attr_list).get("id") or ""
+            self.heading_text = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == self.heading_tag:
+            self.heading_tag = ""
+            heading = " ".join("".join(self.heading_text).split())
+            self._finish()
+            # 上限を超えたセクションは数えない（メモリ使用量を一定に保つ）
+            if self.count < self.rule.max_sections:
+                anchor = f"#{self.heading_id}" if self.heading_id else ""
+                self.section = _Section(anchor, heading[:MAX_HEADING_LENGTH])
+
+    def handle_data(self, data: str) -> None:
+        if self.skip_depth:
+            return
+        if self.heading_tag:
+            self.heading_text.append(data)
+            return
+        text = " ".join(data.split())
+        if text and self.section is not None:
+            self.section.add_text(text)
+
+
+class SectionRule(ExtractionRule):
+    """
+    Splits a page into heading-delimited sections and fingerprints each.
+
+    Entries are `(anchor, heading, digest, simhash)`: the heading's `#id`
+    (or ""), an exact digest of the section text and a 64-bit SimHash over
+    its text nodes. Only these fingerprints are kept, never the text, and at
+    most `max_sections` sections are fingerprinted per page.
+    """
+
+    def __init__(self, max_sections: int = 500):
+        self.max_sections = max_sections
+
+    def matcher(self) -> Matcher:
+        return _SectionMatcher(self)
+
+
+def hamming(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def diff_sections(old: list, new: list, max_distance: int = 3) -> list:
+    """
+    Compares two fingerprint lists from `SectionRule`.
+
+    A section whose digest is unchanged is ignored, even if it moved. One
+    whose heading (or, failing that, SimHash within `max_distance`) matches
+    an old section is "changed"; anything else is "added".
+
+    :return: `(kind, anchor, heading, digest)` tuples in page order.
+    """
+    old_digests = {entry[2] for entry in old}
+    old_keys = Counter(entry[1] for entry in old)
+    old_simhashes = [entry[3] for entry in old]
+    changes = []
+    seen: Counter = Counter()
+    for anchor, heading, digest, simhash in new:
+        seen[heading] += 1
+        if digest in old_digests:
+            continue
+        if seen[heading] <= old_keys[heading] or any(
+            hamming(simhash, h) <= max_distance for h in old_simhashes
+        ):
+            changes.append(("changed", anchor, heading, digest))
+        else:
+            changes.append(("added", anchor, heading, digest))
+    return changes
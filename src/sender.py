@@ -0,0 +1,350 @@
+import asyncio
+import gzip
+import inspect
+import io
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+import discord
+
+from .scheduler import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+DISCORD_LIMIT = 2000
+SLACK_LIMIT = 4000
+# これより多く分割が必要な場合はファイル添付1回で送る
+MAX_CHUNKS = 5
+ATTACHMENT_LIMIT = 8 * 1024 * 1024
+
+# 改行、文末、空白の順に区切りを探す。区切り文字は前のチャンクの末尾に残す
+_BREAKS = (
+    re.compile(r"\n+"),
+    re.compile(r"[。．！？!?.]+\s*"),
+    re.compile(r"\s+"),
+)
+
+
+def _break_at(window: str) -> int:
+    for pattern in _BREAKS:
+        for match in reversed(list(pattern.finditer(window))):
+            # 空白だけのチャンクは送れないため、本文を含む位置でのみ区切る
+            if window[: match.end()].strip():
+                return match.end()
+    return len(window)
+
+
+def split_message(text: str, limit: int = DISCORD_LIMIT) -> list[str]:
+    """
+    Splits `text` into chunks of at most `limit` characters.
+
+    Chunks break at line ends where possible, then at sentence ends and
+    other whitespace, and only cut through a word that is longer than
+    `limit` by itself. No characters are dropped, so joining the chunks
+    gives back `text`.
+    """
+    chunks: list[str] = []
+    while len(text) > limit:
+        cut = _break_at(text[:limit])
+        chunks.append(text[:cut])
+        text = text[cut:]
+    chunks.append(text)
+    return chunks
+
+
+def attachment_payload(text: str, name: str) -> tuple[bytes, str]:
+    """Returns the file bytes and name, gzip-compressed if too large."""
+    data = text.encode("utf-8")
+    if len(data) <= ATTACHMENT_LIMIT:
+        return data, f"{name}.txt"
+    return gzip.compress(data), f"{name}.txt.gz"
+
+
+class TokenBucket:
+    """Allows `capacity` sends at once, refilled at `rate` per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(wait, (1 - self.tokens) / self.rate))
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class LiveText:
+    """
+    A growing text shown as messages that are edited in place.
+
+    `update` replaces the text and its status header; the header, unless
+    empty, goes on top of the first message and the text is split across up to
+    `max_messages` messages, posting new ones as it grows. Updates are
+    coalesced so messages are edited at most once per `interval` seconds,
+    except for the final one. A final text that no longer fits is sent as
+    a file attachment instead, with only its beginning kept in messages.
+    """
+
+    def __init__(
+        self,
+        post: Callable[[str], Awaitable[Any]],
+        edit: Callable[[Any, str], Awaitable[Any]],
+        attach: Callable[[str], Awaitable[Any]],
+        limit: int,
+        max_messages: int = MAX_CHUNKS,
+        interval: float = 2.0,
+    ):
+        self.post = post
+        self.edit = edit
+        self.attach = attach
+        self.limit = limit
+        self.max_messages = max_messages
+        self.interval = interval
+        self.handles: list[Any] = []
+        self.shown: list[str] = []
+        self.last_update = 0.0
+        self._pending = ("", "")
+        self._flush_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str, status: str, final: bool = False):
+        self._pending = (text, status)
+        if final:
+            # 待機中の更新は最終版と同じ内容になるため、取り消さずにそのままにする
+            await self._flush(final=True)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(
+            max(0.0, self.last_update + self.interval - time.monotonic())
+        )
+        await self._flush()
+
+    def _render(self, text: str, status: str) -> tuple[list[str], bool]:
+        # 先頭メッセージのヘッダー分の余裕を残して分割する
+        chunks = split_message(text, self.limit - len(status) - 1) if text else [""]
+        overflow = len(chunks) > self.max_messages
+        chunks = chunks[: self.max_messages]
+        if status:
+            chunks[0] = f"{status}\n{chunks[0]}" if chunks[0] else status
+        return chunks, overflow
+
+    async def _flush(self, final: bool = False):
+        async with self._lock:
+            self.last_update = time.monotonic()
+            text, status = self._pending
+            chunks, overflow = self._render(text, status)
+            for i, chunk in enumerate(chunks):
+                if i >= len(self.handles):
+                    self.handles.append(await self.post(chunk))
+                    self.shown.append(chunk)
+                elif self.shown[i] != chunk:
+                    await self.edit(self.handles[i], chunk)
+                    self.shown[i] = chunk
+            if final and overflow:
+                await self.attach(text)
+
+
+class MessageSender:
+    """
+    Sends long texts to Discord and Slack in as few API calls as possible.
+
+    Text is split with `split_message`; if that needs more than
+    `max_chunks` messages, the first chunk is sent together with the whole
+    text as a file attachment instead. Sends to the same destination are
+    paced by a token bucket, and a rate-limit response blocks the bucket
+    for its `retry_after` before the send is retried.
+    """
+
+    def __init__(self, max_chunks: int = MAX_CHUNKS, retries: int = 3):
+        self.max_chunks = max_chunks
+        self.retries = retries
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def _bucket(self, key: str, capacity: float, rate: float) -> TokenBucket:
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(capacity, rate)
+        return self._buckets[key]
+
+    async def _paced(self, bucket: TokenBucket, send, *args, **kwargs) -> Any:
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            try:
+                return await send(*args, **kwargs)
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.retries:
+                    raise
+                logger.warning(f"レート制限のため{retry_after:.1f}秒待機します。")
+                bucket.block(retry_after)
+
+    async def send_discord(
+        self,
+        channel: Any,
+        text: str,
+        reference: discord.Message | None = None,
+    ) -> list[discord.Message]:
+        """
+        Sends `text` to a Discord channel, replying to `reference` with the
+        first message if given. Returns the sent messages.
+        """
+        # Discordはチャンネルごとに5件/5秒まで
+        bucket = self._bucket(f"discord:{channel.id}", 5, 1)
+        chunks = split_message(text, DISCORD_LIMIT)
+        if len(chunks) > self.max_chunks:
+            message = await self._attach_discord(channel, chunks[0], text, reference)
+            return [message]
+        messages = []
+        for i, chunk in enumerate(chunks):
+            messages.append(
+                await self._paced(
+                    bucket,
+                    channel.send,
+                    chunk,
+                    reference=reference if i == 0 else None,
+                )
+            )
+        return messages
+
+    async def _attach_discord(
+        self,
+        channel: Any,
+        content: str,
+        text: str,
+        reference: discord.Message | None = None,
+    ) -> discord.Message:
+        bucket = self._bucket(f"discord:{channel.id}", 5, 1)
+        data, filename = attachment_payload(text, "message")
+        file = discord.File(io.BytesIO(data), filename=filename)
+        return await self._paced(
+            bucket, channel.send, content, file=file, reference=reference
+        )
+
+    async def reply_discord(self, message: discord.Message, text: str):
+        return await self.send_discord(message.channel, text, reference=message)
+
+    def live_discord(self, reference: discord.Message, **kwargs) -> LiveText:
+        """Returns a `LiveText` replying to `reference` in its channel."""
+        channel = reference.channel
+        bucket = self._bucket(f"discord:{channel.id}", 5, 1)
+
+        async def post(text: str) -> discord.Message:
+            return await self._paced(bucket, channel.send, text, reference=reference)
+
+        async def edit(message: discord.Message, text: str):
+            await self._paced(bucket, message.edit, content=text)
+
+        async def attach(text: str):
+            await self._attach_discord(channel, "全文:", text, reference)
+
+        return LiveText(post, edit, attach, DISCORD_LIMIT, self.max_chunks, **kwargs)
+
+    async def send_slack(
+        self, client: Any, channel: str, text: str, thread_ts: str | None = None
+    ):
+        """Posts `text` with a Slack (Async)`WebClient`, in `thread_ts` if given."""
+        # chat.postMessageはチャンネルごとに1件/秒程度まで
+        bucket = self._bucket(f"slack:{channel}", 1, 1)
+
+        chunks = split_message(text, SLACK_LIMIT)
+        if len(chunks) > self.max_chunks:
+            await self._attach_slack(client, channel, chunks[0], text, thread_ts)
+            return
+        for chunk in chunks:
+            await self._paced(
+                bucket,
+                _call,
+                client.chat_postMessage,
+                channel=channel,
+                text=chunk,
+                thread_ts=thread_ts,
+            )
+
+    async def _attach_slack(
+        self,
+        client: Any,
+        channel: str,
+        content: str,
+        text: str,
+        thread_ts: str | None = None,
+    ):
+        bucket = self._bucket(f"slack:{channel}", 1, 1)
+        data, filename = attachment_payload(text, "message")
+        await self._paced(
+            bucket,
+            _call,
+            client.files_upload_v2,
+            channel=channel,
+            file=data,
+            filename=filename,
+            initial_comment=content,
+            thread_ts=thread_ts,
+        )
+
+    def live_slack(
+        self, client: Any, channel: str, thread_ts: str | None = None, **kwargs
+    ) -> LiveText:
+        """Returns a `LiveText` posted with a Slack (Async)`WebClient`."""
+        bucket = self._bucket(f"slack:{channel}", 1, 1)
+
+        async def post(text: str) -> str:
+            response = await self._paced(
+                bucket,
+                _call,
+                client.chat_postMessage,
+                channel=channel,
+                text=text,
+                thread_ts=thread_ts,
+            )
+            return response["ts"]
+
+        async def edit(ts: str, text: str):
+            await self._paced(
+                bucket, _call, client.chat_update, channel=channel, ts=ts, text=text
+            )
+
+        async def attach(text: str):
+            await self._attach_slack(client, channel, "全文:", text, thread_ts)
+
+        return LiveText(post, edit, attach, SLACK_LIMIT, self.max_chunks, **kwargs)
+
+
+async def _call(method, **kwargs):
+    # AsyncWebClientのメソッドはそのまま待ち、同期のWebClientはスレッドで呼ぶ
+    if inspect.iscoroutinefunction(method):
+        return await method(**kwargs)
+    return await asyncio.to_thread(method, **kwargs)
+
+
+def _retry_after(e: Exception) -> float | None:
+    if isinstance(e, discord.RateLimited):
+        return e.retry_after
+    if isinstance(e, discord.HTTPException):
+        if e.status != 429:
+            return None
+        response = e.response
+    else:
+        response = getattr(e, "response", None)  # slack_sdk.errors.SlackApiError
+        if getattr(response, "status_code", None) != 429:
+            return None
+    headers = getattr(response, "headers", None) or {}
+    return parse_retry_after(headers.get("Retry-After")) or 1.0
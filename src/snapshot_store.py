@@ -0,0 +1,192 @@
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Iterable
+
+try:
+    import zstandard
+
+    _HAS_ZSTD = True
+except ImportError:  # zstandardが無い環境ではzlibで圧縮する
+    _HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    name TEXT PRIMARY KEY,
+    etag TEXT NOT NULL DEFAULT '',
+    last_modified TEXT NOT NULL DEFAULT '',
+    digest TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    UNIQUE (target, entry)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_target ON entries (target, id);
+CREATE INDEX IF NOT EXISTS snapshots_target ON snapshots (target, id);
+"""
+
+
+def _encode_entry(entry: Any) -> str:
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode_entry(text: str) -> Any:
+    entry = json.loads(text)
+    return tuple(entry) if isinstance(entry, list) else entry
+
+
+def compress(data: bytes) -> tuple[str, bytes]:
+    if _HAS_ZSTD:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if not _HAS_ZSTD:
+            raise RuntimeError("zstandard is required to read this snapshot")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+class SnapshotStore:
+    """
+    SQLite (WAL mode) store for per-target watcher state.
+
+    Holds the seen entries, the HTTP validators and, optionally, compressed
+    page snapshots. Snapshots are archival only: the watcher never reads
+    them back, they are kept for inspecting a page's history by hand
+    (decode `data` with `decompress(codec, data)`). Every check is written
+    in a single transaction, so a crash leaves either the old or the new
+    state, never a torn one.
+
+    :param path: Database file path.
+    :param retention_days: Snapshots older than this are evicted.
+    :param max_snapshots: Snapshots kept per target at most.
+    """
+
+    def __init__(self, path: str, retention_days: float = 30, max_snapshots: int = 10):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_snapshots = max_snapshots
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def load_entries(self, target: str, limit: int) -> list | None:
+        """Returns the newest `limit` entries, or None for a new target."""
+        if self.load_fetch_state(target) is None:
+            return None
+        rows = self.conn.execute(
+            "SELECT entry FROM entries WHERE target = ? ORDER BY id DESC LIMIT ?",
+            (target, limit),
+        )
+        return [_decode_entry(entry) for (entry,) in rows]
+
+    def load_fetch_state(self, target: str) -> dict[str, str] | None:
+        row = self.conn.execute(
+            "SELECT etag, last_modified, digest FROM targets WHERE name = ?",
+            (target,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "digest": row[2]}
+
+    def record_check(
+        self,
+        target: str,
+        added_entries: Iterable[Any] = (),
+        fetch_state: dict[str, str] | None = None,
+        snapshot: bytes | None = None,
+        max_entries: int = 10000,
+        replace: bool = False,
+    ):
+        """
+        Atomically stores the result of one check.
+
+        :param added_entries: New entries in page order (newest first).
+        :param fetch_state: `etag`, `last_modified` and `digest` to remember.
+        :param snapshot: Raw page body to store compressed.
+        :param max_entries: Seen entries kept for the target at most.
+        :param replace: Drop the previously stored entries first.
+        """
+        now = time.time()
+        state = fetch_state or {}
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO targets (name, etag, last_modified, digest, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                "etag = excluded.etag, last_modified = excluded.last_modified, "
+                "digest = excluded.digest, updated_at = excluded.updated_at",
+                (
+                    target,
+                    state.get("etag", ""),
+                    state.get("last_modified", ""),
+                    state.get("digest", ""),
+                    now,
+                ),
+            )
+            if replace:
+                self.conn.execute("DELETE FROM entries WHERE target = ?", (target,))
+            # 古い順に挿入し、idの大きいものが新しいエントリになるようにする
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entries (target, entry, seen_at) "
+                "VALUES (?, ?, ?)",
+                [
+                    (target, _encode_entry(e), now)
+                    for e in reversed(list(added_entries))
+                ],
+            )
+            self.conn.execute(
+                "DELETE FROM entries WHERE target = ? AND id NOT IN "
+                "(SELECT id FROM entries WHERE target = ? ORDER BY id DESC LIMIT ?)",
+                (target, target, max_entries),
+            )
+            if snapshot is not None:
+                codec, data = compress(snapshot)
+                self.conn.execute(
+                    "INSERT INTO snapshots (target, taken_at, codec, size, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (target, now, codec, len(snapshot), data),
+                )
+                self._evict_snapshots(target, now)
+
+    def _evict_snapshots(self, target: str, now: float):
+        self.conn.execute(
+            "DELETE FROM snapshots WHERE target = ? AND (taken_at < ? OR id NOT IN "
+            "(SELECT id FROM snapshots WHERE target = ? ORDER BY id DESC LIMIT ?))",
+            (target, now - self.retention_days * 86400, target, self.max_snapshots),
+        )
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import sqlite3
+import time
+
+from .snapshot_store import compress, decompress
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    key TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_used ON transcripts (used_at);
+"""
+
+
+def file_digest(path: str) -> str:
+    """Returns a digest of the file's bytes, read in 1 MiB blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(kind: str, audio_digest: str, *settings: str) -> str:
+    """Combines an audio digest with everything that affects its transcript."""
+    parts = "\0".join((kind, audio_digest, *settings)).encode("utf-8")
+    return hashlib.blake2b(parts, digest_size=20).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Content-addressed transcripts in SQLite (WAL mode).
+
+    Keys come from `cache_key`, so the same recording re-posted anywhere
+    hits the same entry. Entries unused for `max_age_days` are dropped, and
+    once the stored transcripts exceed `max_bytes` the least recently used
+    ones are evicted.
+
+    :param path: Database file path.
+    :param max_bytes: Upper bound of the compressed transcripts' total size.
+    :param max_age_days: Entries not read or written for this long expire.
+    """
+
+    def __init__(
+        self, path: str, max_bytes: int = 200 * 1024 * 1024, max_age_days: float = 90
+    ):
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT codec, data FROM transcripts WHERE key = ? AND used_at >= ?",
+            (key, now - self.max_age_days * 86400),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE transcripts SET used_at = ? WHERE key = ?", (now, key)
+        )
+        return decompress(row[0], row[1]).decode("utf-8")
+
+    def put(self, key: str, text: str):
+        now = time.time()
+        codec, data = compress(text.encode("utf-8"))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO transcripts "
+            "(key, codec, size, data, created_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, codec, len(data), data, now, now),
+        )
+        self._evict(now)
+
+    def _evict(self, now: float):
+        self.conn.execute(
+            "DELETE FROM transcripts WHERE used_at < ?",
+            (now - self.max_age_days * 86400,),
+        )
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcripts"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        # 最近使われていないものから、合計サイズが上限を下回るまで削除する
+        keys = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM transcripts ORDER BY used_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            keys.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM transcripts WHERE key = ?", keys)
+        logger.info(f"文字起こしキャッシュから{len(keys)}件を削除しました")
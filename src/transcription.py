@@ -0,0 +1,408 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable
+
+from .audio_utils import (
+    DEFAULT_MAX_CHUNK_BYTES,
+    SegmentPlan,
+    ingest_speech,
+    iter_segments,
+    mp4_needs_seek,
+)
+from .transcript_cache import TranscriptCache, cache_key, file_digest
+from .utils import format_seconds
+from .workspace import DEFAULT_QUOTA_BYTES, QuotaExceeded, Workspace
+
+logger = logging.getLogger(__name__)
+
+TranscribeFunc = Callable[[str, str], Awaitable[str]]
+
+MODES = ("parallel", "strict")
+# Whisperのpromptは末尾224トークンしか使われないため、前のチャンクは末尾だけ渡す
+PROMPT_TAIL_CHARS = 200
+# MP4のmoovがmdatより前にあるかを判定するために先読みする量
+PEEK_BYTES = 64 * 1024
+
+
+def chunk_prompt(prompt: str, previous: str | None, tail_chars: int) -> str:
+    """Appends the end of the previous chunk's text to `prompt`, if known."""
+    if not previous:
+        return prompt
+    tail = previous[-tail_chars:]
+    return f"{prompt}\n\n{tail}" if prompt else tail
+
+
+@dataclass
+class TranscriptionProgress:
+    """
+    Chunk results of one file as they arrive. `results` holds None for
+    chunks still running; `text` only covers the leading finished run, so
+    it can be shown as-is while later chunks are pending.
+    """
+
+    started: float = field(default_factory=time.monotonic)
+    results: list[str | None] = field(default_factory=list)
+    total: int = 0  # 分割計画からの見込み。実際のチャンク数に合わせて増える
+    failed: int = 0
+
+    @property
+    def done(self) -> int:
+        return sum(result is not None for result in self.results)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(
+            result
+            for result in itertools.takewhile(lambda r: r is not None, self.results)
+            if result is not None
+        )
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def eta(self) -> float | None:
+        if not self.done:
+            return None
+        return self.elapsed / self.done * max(0, self.total - self.done)
+
+    def status(self) -> str:
+        status = (
+            f"書き起こし中: チャンク {self.done}/{self.total} 完了 "
+            f"(経過 {format_seconds(self.elapsed)}"
+        )
+        if self.eta is not None:
+            status += f", 残り約 {format_seconds(self.eta)}"
+        return status + ")"
+
+
+ProgressFunc = Callable[[TranscriptionProgress], Awaitable[None]]
+
+
+async def _peek(
+    source: AsyncIterator[bytes], size: int
+) -> tuple[bytes, AsyncIterator[bytes]]:
+    """Reads at least `size` bytes (unless shorter) without consuming them."""
+    head = b""
+    async for data in source:
+        head += data
+        if len(head) >= size:
+            break
+
+    async def replay() -> AsyncIterator[bytes]:
+        yield head
+        async for data in source:
+            yield data
+
+    return head, replay()
+
+
+async def _spool(source: AsyncIterator[bytes], path: str, workspace: Workspace):
+    written = 0
+    limit = workspace.remaining()
+    with open(path, "wb") as f:
+        async for data in source:
+            written += len(data)
+            if written > limit:
+                raise QuotaExceeded(f"{path} exceeds the workspace quota")
+            f.write(data)
+
+
+async def _prefetch(chunks: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    # 消費側が文字起こしを待っている間も分割を先に進める
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async with aclosing(chunks):
+                async for path in chunks:
+                    await queue.put(path)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(done)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # ffmpegを止めてから一時ディレクトリを削除させる
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+class TranscriptionPipeline:
+    """
+    Splits audio files and transcribes their chunks on the event loop.
+
+    Chunks are uploaded while ffmpeg is still producing the next ones
+    (see `iter_segments`), and at most `concurrency` uploads run at a time
+    across every file handled by this pipeline. In "strict" mode chunks are
+    transcribed one after another, each prompted with the end of the
+    previous chunk's text. In "parallel" mode every chunk starts as soon as
+    it is ready and a slot is free, prompted with `prompt` alone so that its
+    text (and cache key) doesn't depend on which chunks finished first.
+
+    `transcribe` should raise on failure: the chunk is then shown as a
+    failure marker in the text. With a `cache`, results without failures
+    are stored per file and per chunk, keyed by content; see
+    `transcribe_stream` for when each lookup happens. Every file is
+    processed in its own `Workspace`, which is removed afterwards.
+    """
+
+    def __init__(
+        self,
+        transcribe: TranscribeFunc,
+        concurrency: int = 4,
+        mode: str = "parallel",
+        preprocess: bool = True,
+        tail_chars: int = PROMPT_TAIL_CHARS,
+        max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+        cache: TranscriptCache | None = None,
+        model: str = "whisper-1",
+        workspace_root: str | None = None,
+        workspace_quota: int = DEFAULT_QUOTA_BYTES,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown transcription mode: {mode}")
+        self.transcribe = transcribe
+        self.mode = mode
+        self.preprocess = preprocess
+        self.tail_chars = tail_chars
+        self.max_chunk_bytes = max_chunk_bytes
+        self.cache = cache
+        self.model = model
+        self.workspace_root = workspace_root
+        self.workspace_quota = workspace_quota
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _workspace(self) -> Workspace:
+        return Workspace(self.workspace_root, self.workspace_quota, prefix="audio_")
+
+    def _file_key(self, digest: str, prompt: str) -> str:
+        return cache_key(
+            "file",
+            digest,
+            self.model,
+            prompt,
+            self.mode,
+            "preprocess" if self.preprocess else "",
+        )
+
+    def _cached(self, key: str | None, name: str) -> str | None:
+        if self.cache is None or key is None:
+            return None
+        text = self.cache.get(key)
+        if text is not None:
+            logger.info(f"{name} の文字起こしをキャッシュから返します")
+        return text
+
+    async def transcribe_stream(
+        self,
+        source: AsyncIterator[bytes],
+        prompt: str,
+        on_progress: ProgressFunc | None = None,
+        name: str = "audio",
+    ) -> str:
+        """
+        Returns the transcription of the audio read from `source`, e.g. a
+        download, with chunks joined by newlines.
+
+        With `preprocess`, the stream is piped straight into ffmpeg (see
+        `ingest_speech`) and only the compact speech encoding is stored; an
+        MP4 that cannot be read from a pipe, or any input without
+        `preprocess`, is saved into the job's workspace first.
+
+        The whole-file cache can only be checked once the stream has been
+        read, as the digest covers every byte. A spooled file is therefore
+        answered from the cache before any ffmpeg work, while a piped one
+        has already been converted by then and a hit only saves the API
+        calls. Chunks are looked up before their own API call either way.
+
+        :param on_progress: Awaited with the progress after every finished
+            chunk, e.g. to show partial results; its errors are only logged.
+        :param name: File name of the audio, used in logs.
+        """
+        digest = hashlib.blake2b(digest_size=20)  # file_digestと同じ値になる
+        received = 0
+
+        async def hashed() -> AsyncIterator[bytes]:
+            nonlocal received
+            async for data in source:
+                digest.update(data)
+                received += len(data)
+                yield data
+
+        with self._workspace() as workspace:
+            head, stream = await _peek(hashed(), PEEK_BYTES)
+            plan = None
+            if self.preprocess and not mp4_needs_seek(head):
+                input_file, plan = await ingest_speech(
+                    stream,
+                    workspace.path,
+                    workspace.remaining(),
+                    self.max_chunk_bytes,
+                )
+            else:
+                input_file = workspace.file(os.path.basename(name) or "audio")
+                await _spool(stream, input_file, workspace)
+            file_key = None
+            if self.cache is not None:
+                file_key = self._file_key(digest.hexdigest(), prompt)
+                if (text := self._cached(file_key, name)) is not None:
+                    return text
+            # 変換後のファイルではなく、受け取った元の音声の大きさを記録する
+            return await self._transcribe(
+                input_file, workspace, prompt, file_key, on_progress, plan, received
+            )
+
+    async def _transcribe(
+        self,
+        input_file: str,
+        workspace: Workspace,
+        prompt: str,
+        file_key: str | None,
+        on_progress: ProgressFunc | None,
+        plan: SegmentPlan | None = None,
+        source_bytes: int | None = None,
+    ) -> str:
+        # チャンクの合計は元のファイルとほぼ同じ大きさになる
+        workspace.check(os.path.getsize(input_file))
+        progress = TranscriptionProgress()
+
+        def on_plan(plan: SegmentPlan):
+            progress.total = plan.chunk_count
+
+        if plan is not None:
+            on_plan(plan)
+
+        async def completed(index: int, text: str):
+            progress.results[index] = text
+            if on_progress is None:
+                return
+            try:
+                await on_progress(progress)
+            except Exception as e:
+                logger.warning(f"途中経過の送信に失敗しました: {e}")
+
+        chunks = _prefetch(
+            iter_segments(
+                input_file,
+                workspace.file("chunks"),
+                self.max_chunk_bytes,
+                preprocess=self.preprocess,
+                on_plan=on_plan,
+                plan=plan,
+                source_bytes=source_bytes,
+            )
+        )
+        async with aclosing(chunks):
+            if self.mode == "strict":
+                await self._strict(chunks, prompt, progress, completed)
+            else:
+                await self._parallel(chunks, prompt, progress, completed)
+        logger.info(
+            f"{input_file} の文字起こし完了: {len(progress.results)}チャンク, "
+            f"処理時間 {progress.elapsed:.2f}秒"
+        )
+        if self.cache is not None and file_key is not None and not progress.failed:
+            self.cache.put(file_key, progress.text)
+        return progress.text
+
+    async def _transcribe_chunk(
+        self,
+        index: int,
+        path: str,
+        prompt: str,
+        previous: str | None,
+        progress: TranscriptionProgress,
+    ) -> str:
+        try:
+            return await self._request_chunk(index, path, prompt, previous, progress)
+        finally:
+            # 処理済みのチャンクはすぐに消してワークスペースを空ける
+            os.remove(path)
+
+    async def _request_chunk(
+        self,
+        index: int,
+        path: str,
+        prompt: str,
+        previous: str | None,
+        progress: TranscriptionProgress,
+    ) -> str:
+        prompt = chunk_prompt(prompt, previous, self.tail_chars)
+        key = None
+        if self.cache is not None:
+            digest = await asyncio.to_thread(file_digest, path)
+            key = cache_key("chunk", digest, self.model, prompt)
+            if (text := self.cache.get(key)) is not None:
+                logger.info(f"チャンク {index + 1} をキャッシュから取得しました")
+                return text
+        logger.info(f"チャンク {index + 1} の文字起こしを開始: {path}")
+        try:
+            text = await self.transcribe(path, prompt)
+        except Exception as e:
+            logger.error(f"チャンク {index + 1} の文字起こしでエラーが発生: {e}")
+            progress.failed += 1
+            return f"<書き起こしに失敗しました: {str(e)}>"
+        logger.info(f"チャンク {index + 1} の文字起こし完了")
+        if self.cache is not None and key is not None:
+            self.cache.put(key, text)
+        return text
+
+    async def _strict(
+        self,
+        chunks: AsyncIterator[str],
+        prompt: str,
+        progress: TranscriptionProgress,
+        completed: Callable[[int, str], Awaitable[None]],
+    ):
+        results = progress.results
+        async for path in chunks:
+            index = len(results)
+            previous = results[-1] if results else None
+            results.append(None)
+            progress.total = max(progress.total, len(results))
+            async with self.semaphore:
+                text = await self._transcribe_chunk(
+                    index, path, prompt, previous, progress
+                )
+            await completed(index, text)
+        progress.total = len(results)
+
+    async def _parallel(
+        self,
+        chunks: AsyncIterator[str],
+        prompt: str,
+        progress: TranscriptionProgress,
+        completed: Callable[[int, str], Awaitable[None]],
+    ):
+        results = progress.results
+
+        async def run(index: int, path: str):
+            async with self.semaphore:
+                text = await self._transcribe_chunk(index, path, prompt, None, progress)
+            await completed(index, text)
+
+        tasks: list[asyncio.Task[None]] = []
+        try:
+            async for path in chunks:
+                results.append(None)
+                progress.total = max(progress.total, len(results))
+                tasks.append(asyncio.create_task(run(len(tasks), path)))
+            progress.total = len(results)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,131 @@
+import asyncio
+import importlib.util
+import logging
+import os
+from abc import ABC, abstractmethod
+
+from openai import AsyncOpenAI
+
+from .utils import spawn_pool
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBackend(ABC):
+    """
+    Turns one audio file into text. `model` identifies the engine and model
+    in cache keys, so switching backends never returns stale transcripts.
+    Failures are raised to the caller.
+    """
+
+    model = ""
+
+    @abstractmethod
+    async def transcribe(self, audio_file_path: str, prompt: str) -> str:
+        pass
+
+    def close(self):
+        pass
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """
+    OpenAI's transcription endpoint. `base_url` points the client at any
+    compatible server, e.g. `tools/transcription_server.py` for offline
+    runs.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "whisper-1",
+        base_url: str | None = None,
+        timeout: float = 180.0,
+        max_retries: int = 2,
+    ):
+        self.client = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries
+        )
+        self.model = model if base_url is None else f"{model}@{base_url}"
+        self.api_model = model
+
+    async def transcribe(self, audio_file_path: str, prompt: str) -> str:
+        with open(audio_file_path, "rb") as audio_file:
+            response = await self.client.audio.transcriptions.create(
+                file=audio_file,
+                model=self.api_model,
+                prompt=prompt,
+            )
+        return response.text
+
+
+# ワーカープロセスごとに一度だけ読み込み、ジョブをまたいで使い回すモデル
+_worker_model = None
+
+
+def _load_worker_model(model: str, compute_type: str, cpu_threads: int):
+    global _worker_model
+    from faster_whisper import WhisperModel
+
+    _worker_model = WhisperModel(
+        model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads
+    )
+
+
+def _transcribe_in_worker(audio_file_path: str, prompt: str, language: str | None):
+    assert _worker_model is not None
+    segments, _ = _worker_model.transcribe(
+        audio_file_path, initial_prompt=prompt or None, language=language
+    )
+    return "".join(segment.text for segment in segments).strip()
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) on the local CPU, int8-quantized by default.
+
+    Runs in a pool of `workers` processes that each load the model once and
+    keep it for every later job; by default each worker uses up to 4
+    threads and there are as many workers as fit in the cores. Chunks from
+    the pipeline are spread over the workers, so no upload or API round
+    trip is involved.
+
+    :param model: faster-whisper model name or path, e.g. "small".
+    :param compute_type: CTranslate2 compute type.
+    :param workers: Number of worker processes.
+    :param cpu_threads: Threads per worker.
+    :param language: Language code, or None to detect it per chunk.
+    """
+
+    def __init__(
+        self,
+        model: str = "small",
+        compute_type: str = "int8",
+        workers: int | None = None,
+        cpu_threads: int | None = None,
+        language: str | None = None,
+    ):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError("faster-whisper is required for the local backend")
+        cores = os.cpu_count() or 1
+        self.cpu_threads = cpu_threads or min(4, cores)
+        self.workers = workers or max(1, cores // self.cpu_threads)
+        self.language = language
+        # 言語指定で結果が変わるため、キャッシュキー用の名前に含める
+        self.model = f"faster-whisper:{model}:{compute_type}:{language or 'auto'}"
+        self.pool = spawn_pool(
+            self.workers, _load_worker_model, (model, compute_type, self.cpu_threads)
+        )
+        logger.info(
+            f"ローカル文字起こしを起動: {self.model}, "
+            f"{self.workers}プロセス x {self.cpu_threads}スレッド"
+        )
+
+    async def transcribe(self, audio_file_path: str, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool, _transcribe_in_worker, audio_file_path, prompt, self.language
+        )
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,31 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+
+def format_seconds(seconds: float) -> str:
+    """Formats a duration as "m:ss", or "h:mm:ss" from an hour on."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return (
+        f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+    )
+
+
+def spawn_pool(
+    workers: int,
+    initializer: Callable[..., Any] | None = None,
+    initargs: tuple = (),
+) -> ProcessPoolExecutor:
+    """
+    Returns a process pool whose workers are started with "spawn": forking
+    the bot, which runs threads, could leave locks held in the children.
+    Spawned workers import the main module as `__mp_main__`, so it must not
+    create clients or pools at import time.
+    """
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs,
+    )
@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .entry_index import EntryIndex
+from .extractors import ExtractionRule, compile_rule, extract_stream
+from .feeds import discover_feed, feed_signature
+from .http_client import response_encoding
+from .scheduler import PollScheduler, parse_retry_after
+from .sections import SectionRule, diff_sections
+from .snapshot_store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class WatchTarget:
+    """
+    A single page to watch.
+
+    :param name: Identifier used in logs and as the store key.
+    :param url: Page URL to poll.
+    :param channel_id: Discord channel that receives update notifications.
+    :param slack_channel: Slack channel that also receives them, if set.
+    :param interval: Initial seconds between successful checks.
+    :param min_interval: Lower bound for the adapted interval (0: `interval`).
+    :param max_interval: Upper bound for the adapted interval (0: `interval`).
+    :param extractor: Preset name or rule spec, see `compile_rule`.
+    :param message: Notification template, formatted with `titles_text`.
+    :param cache_file: Legacy cache file, imported once into the store.
+    :param newest_first: Whether the page lists entries newest first, so
+        reading can stop at the newest known entry.
+    :param snapshot: Whether to archive compressed snapshots of the read
+        body in the store, for inspection by hand.
+    :param feed: RSS/Atom feed or sitemap URL polled before the page, which is
+        only fetched when the feed signals a change. "auto" discovers the
+        feed from the page's `<link rel="alternate">`.
+    """
+
+    name: str
+    url: str
+    channel_id: int
+    slack_channel: str = ""
+    interval: float = 86400
+    min_interval: float = 0
+    max_interval: float = 0
+    extractor: str | dict = "title01"
+    message: str = "{titles_text}"
+    cache_file: str = ""
+    newest_first: bool = True
+    snapshot: bool = False
+    feed: str = ""
+    rule: ExtractionRule = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.rule = compile_rule(self.extractor)
+
+    @classmethod
+    def from_config(cls, entry: dict, defaults: dict) -> "WatchTarget":
+        values = {**defaults, **entry}
+        values.setdefault("name", values["url"])
+        fields = {k for k, f in cls.__dataclass_fields__.items() if f.init}
+        try:
+            return cls(**{k: v for k, v in values.items() if k in fields})
+        except ValueError as e:
+            raise ValueError(f"Invalid watch target {values['name']!r}: {e}") from e
+
+
+@dataclass
+class FetchState:
+    """HTTP validators and body digest remembered from a target's last fetch."""
+
+    etag: str = ""
+    last_modified: str = ""
+    digest: str = ""
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+# (ターゲット, (URL, タイトル)のリスト, 変更内容を表すリビジョン)
+NotifyCallback = Callable[[WatchTarget, list, str], Awaitable[None]]
+
+
+def load_legacy_cache(path: str, rule: ExtractionRule) -> list | None:
+    if not (path and os.path.exists(path)):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        try:
+            entries = [
+                tuple(e) if isinstance(e, list) else e for e in json.loads(content)
+            ]
+        except json.JSONDecodeError:
+            # 旧形式（ページ全体のHTML）のキャッシュ
+            entries = rule.extract(content)
+        logger.info(f"キャッシュファイルから前回の内容を読み込みました: {path}")
+        return entries
+    except Exception as e:
+        logger.error(f"キャッシュファイルの読み込みに失敗しました: {e}")
+        return None
+
+
+async def fetch_entries(
+    session: aiohttp.ClientSession,
+    url: str,
+    rule: ExtractionRule,
+    state: FetchState,
+    stop_at: Any = None,
+    body: bytearray | None = None,
+) -> tuple[list, FetchState] | None:
+    """
+    Streams `url` through `rule` and returns the entries above `stop_at`
+    together with the page's new `FetchState`.
+
+    Returns None on a 304 or, when the whole body was read, on a digest
+    match. Once `stop_at` is extracted the rest of the body is never
+    downloaded. The bytes read are appended to `body` if given. `state` is
+    not modified; the caller stores the new state once the entries have
+    been handled, so a failure in between does not hide the update.
+    """
+    try:
+        async with session.get(url, headers=state.conditional_headers()) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            new_state = FetchState(
+                etag=response.headers.get("ETag", ""),
+                last_modified=response.headers.get("Last-Modified", ""),
+                digest=state.digest,
+            )
+            hasher = hashlib.blake2b(digest_size=16)
+
+            def on_chunk(chunk: bytes):
+                hasher.update(chunk)
+                if body is not None:
+                    body.extend(chunk)
+
+            entries, stopped = await extract_stream(
+                response.content.iter_chunked(STREAM_CHUNK_SIZE),
+                rule,
+                encoding=response_encoding(response),
+                stop_at=stop_at,
+                on_chunk=on_chunk,
+            )
+            if not stopped:
+                new_state.digest = hasher.hexdigest()
+                if new_state.digest == state.digest:
+                    return None
+            return entries, new_state
+    except aiohttp.ClientError as e:
+        logger.error(f"サイト取得エラー: {e}")
+        raise
+
+
+class SiteWatcher:
+    """
+    Polls many `WatchTarget`s from a single loop.
+
+    Every target shares one `aiohttp.ClientSession`, either the given
+    `session` (e.g. the application's shared pool) or one of its own.
+    Semaphores bound how many checks run at once in total and per host.
+    Idle targets are just entries in the `PollScheduler` queue, so adding a
+    target does not add a sleeping task.
+    """
+
+    def __init__(
+        self,
+        targets: list[WatchTarget],
+        notify: NotifyCallback,
+        store: SnapshotStore,
+        max_concurrency: int = 20,
+        max_per_host: int = 4,
+        error_interval: float = 86400,
+        max_seen_entries: int = 10000,
+        scheduler: PollScheduler[str] | None = None,
+        session: aiohttp.ClientSession | None = None,
+    ):
+        self.targets = targets
+        self.session = session
+        self.notify = notify
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.scheduler = scheduler or PollScheduler(error_cap=error_interval)
+        self.max_seen_entries = max_seen_entries
+        # 起動時に一度だけ読み込み、以降はメモリ上の索引だけで差分を取る
+        self._indexes: dict[str, EntryIndex | None] = {}
+        self._fetch_states: dict[str, FetchState] = {}
+        for t in targets:
+            self._indexes[t.name], self._fetch_states[t.name] = self._load(t)
+        self._targets = {t.name: t for t in targets}
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._feed_urls: dict[str, str] = {
+            t.name: t.feed for t in targets if t.feed != "auto"
+        }
+        # フィードの状態は「<name>#feed」というキーで保存する
+        self._feed_states: dict[str, FetchState] = {
+            t.name: FetchState(**(self.store.load_fetch_state(f"{t.name}#feed") or {}))
+            for t in targets
+            if t.feed
+        }
+
+    def _load(self, target: WatchTarget) -> tuple[EntryIndex | None, FetchState]:
+        entries = self.store.load_entries(target.name, self.max_seen_entries)
+        state = self.store.load_fetch_state(target.name)
+        if entries is None:
+            entries = load_legacy_cache(target.cache_file, target.rule)
+            if entries is not None:
+                self.store.record_check(
+                    target.name, entries, max_entries=self.max_seen_entries
+                )
+                logger.info(f"[{target.name}] 旧キャッシュファイルを取り込みました。")
+        if entries is None:
+            return None, FetchState()
+        return EntryIndex(entries, self.max_seen_entries), FetchState(**(state or {}))
+
+    async def run(self):
+        if self.session is not None:
+            await self._poll(self.session)
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.max_per_host
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await self._poll(session)
+
+    async def _poll(self, session: aiohttp.ClientSession):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        for t in self.targets:
+            self.scheduler.add(
+                t.name,
+                t.interval,
+                t.min_interval or t.interval,
+                t.max_interval or t.interval,
+            )
+        logger.info(f"{len(self.targets)}件のサイト監視を開始します。")
+
+        running: set[asyncio.Task] = set()
+        while True:
+            target = self._targets[await self.scheduler.next_due()]
+            await semaphore.acquire()
+            task = asyncio.create_task(self._run_check(session, target))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        # 共有セッションでも同じホストへの同時アクセスを max_per_host に抑える
+        host = urlsplit(url).hostname or ""
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    async def _run_check(self, session: aiohttp.ClientSession, target: WatchTarget):
+        try:
+            async with self._host_slot(target.url):
+                changed = await self.check(session, target)
+            self.scheduler.success(target.name, changed)
+        except Exception as e:
+            retry_after = None
+            if isinstance(e, aiohttp.ClientResponseError) and e.headers:
+                retry_after = parse_retry_after(e.headers.get("Retry-After"))
+            delay = self.scheduler.failure(target.name, retry_after)
+            logger.error(
+                f"[{target.name}] エラーが発生しました: {e} ({delay:.0f}秒後に再試行)"
+            )
+
+    async def _feed_url(self, session: aiohttp.ClientSession, target: WatchTarget):
+        if target.name not in self._feed_urls:
+            try:
+                self._feed_urls[target.name] = await discover_feed(session, target.url)
+            except (aiohttp.ClientError, UnicodeError, LookupError) as e:
+                # 検出できなければページを直接確認する
+                logger.warning(f"[{target.name}] フィードの検出に失敗しました: {e}")
+                return ""
+            logger.info(
+                f"[{target.name}] フィード: {self._feed_urls[target.name] or 'なし'}"
+            )
+        return self._feed_urls[target.name]
+
+    async def check_feed(
+        self, session: aiohttp.ClientSession, target: WatchTarget
+    ) -> FetchState | None:
+        """
+        Polls the target's feed and returns its new state if the page should
+        be fetched, or None if the feed signals no change.
+        """
+        feed_url = await self._feed_url(session, target)
+        if not feed_url:
+            return FetchState()
+        state = self._feed_states[target.name]
+        try:
+            async with session.get(
+                feed_url, headers=state.conditional_headers()
+            ) as response:
+                if response.status == 304:
+                    return None
+                response.raise_for_status()
+                data = await response.read()
+                new_state = FetchState(
+                    etag=response.headers.get("ETag", ""),
+                    last_modified=response.headers.get("Last-Modified", ""),
+                    digest=feed_signature(data, target.url),
+                )
+        except (aiohttp.ClientError, ET.ParseError) as e:
+            # フィードが使えない場合はページを直接確認する
+            logger.warning(f"[{target.name}] フィードの取得に失敗しました: {e}")
+            return FetchState()
+        if new_state.digest == state.digest:
+            self._feed_states[target.name] = new_state
+            return None
+        return new_state
+
+    async def check(self, session: aiohttp.ClientSession, target: WatchTarget) -> bool:
+        """Checks `target` once and returns whether new entries were found."""
+        if not target.feed:
+            return await self.check_page(session, target)
+        feed_state = await self.check_feed(session, target)
+        if feed_state is None:
+            logger.info(f"[{target.name}] フィードに更新はありません。")
+            return False
+        changed = await self.check_page(session, target)
+        if feed_state.digest:
+            # ページの確認が終わってからフィードの状態を記録する
+            self._feed_states[target.name] = feed_state
+            self.store.record_check(
+                f"{target.name}#feed", fetch_state=asdict(feed_state)
+            )
+        return changed
+
+    async def check_page(
+        self, session: aiohttp.ClientSession, target: WatchTarget
+    ) -> bool:
+        index = self._indexes.get(target.name)
+        state = self._fetch_states[target.name]
+        # 新しい順に並ぶ一覧ページでは、既知の最新エントリ以降は読まない
+        stop_at = None
+        if index and target.newest_first and not isinstance(target.rule, SectionRule):
+            stop_at = index.newest
+        body = bytearray() if target.snapshot else None
+        result = await fetch_entries(
+            session, target.url, target.rule, state, stop_at, body
+        )
+        if result is None:
+            logger.info(f"[{target.name}] 前回から変更はありません。")
+            return False
+        entries, state = result
+        snapshot = bytes(body) if body is not None else None
+        if index is None:
+            self.store.record_check(
+                target.name, entries, asdict(state), snapshot, self.max_seen_entries
+            )
+            self._fetch_states[target.name] = state
+            self._indexes[target.name] = EntryIndex(entries, self.max_seen_entries)
+            logger.info(f"[{target.name}] 初回チェック完了。内容を保存しました。")
+            return False
+        if isinstance(target.rule, SectionRule):
+            return await self._check_sections(target, index, entries, state, snapshot)
+
+        added_entries = index.diff(entries)
+        if added_entries:
+            # 一覧のエントリはURLごとに一度しか通知しないため、リビジョンは不要
+            await self.notify(target, added_entries, "")
+        else:
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            logger.info(
+                f"[{target.name}] 更新は検知されませんでした。 現在の時刻: {current_time}"
+            )
+        # 通知と記録が済んでから検証子を更新し、失敗時は次回同じ更新を検知し直す
+        self.store.record_check(
+            target.name, added_entries, asdict(state), snapshot, self.max_seen_entries
+        )
+        self._fetch_states[target.name] = state
+        index.add(added_entries)
+        return bool(added_entries)
+
+    async def _check_sections(
+        self,
+        target: WatchTarget,
+        index: EntryIndex,
+        sections: list,
+        state: FetchState,
+        snapshot: bytes | None,
+    ) -> bool:
+        # セクションの指紋は累積せず、毎回現在のページの内容で置き換える
+        changes = diff_sections(list(index), sections)
+        if changes:
+            labels = {"added": "追加", "changed": "更新"}
+            # 同じセクションの別の更新も区別できるよう、変更後の内容を表す値を渡す
+            revision = hashlib.blake2b(
+                " ".join(change[3] for change in changes).encode(), digest_size=16
+            ).hexdigest()
+            await self.notify(
+                target,
+                [
+                    (target.url + anchor, f"[{labels[kind]}] {heading or '(冒頭)'}")
+                    for kind, anchor, heading, _ in changes
+                ],
+                revision,
+            )
+        else:
+            logger.info(f"[{target.name}] 変更されたセクションはありません。")
+        self.store.record_check(
+            target.name,
+            sections,
+            asdict(state),
+            snapshot,
+            self.max_seen_entries,
+            replace=True,
+        )
+        self._fetch_states[target.name] = state
+        self._indexes[target.name] = EntryIndex(sections, self.max_seen_entries)
+        return bool(changes)
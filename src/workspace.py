@@ -0,0 +1,74 @@
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# tmpfs（RAM上）に置ければディスクI/Oを避けられる
+TMPFS_ROOT = "/dev/shm"
+DEFAULT_QUOTA_BYTES = 512 * 1024 * 1024
+
+
+class QuotaExceeded(OSError):
+    pass
+
+
+def default_root() -> str:
+    if os.path.isdir(TMPFS_ROOT) and os.access(TMPFS_ROOT, os.W_OK):
+        return TMPFS_ROOT
+    return tempfile.gettempdir()
+
+
+class Workspace:
+    """
+    A private directory for one job, removed with everything in it on exit.
+
+    Each workspace gets a unique directory under `root` (tmpfs when
+    available), so concurrent jobs never share file names. Writers are
+    expected to stay within `quota_bytes`: `remaining` tells how much they
+    may still write and `check` raises `QuotaExceeded` once it is used up.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        quota_bytes: int = DEFAULT_QUOTA_BYTES,
+        prefix: str = "job_",
+    ):
+        self.root = root or default_root()
+        self.quota_bytes = quota_bytes
+        self.prefix = prefix
+        self.path = ""
+
+    def __enter__(self) -> "Workspace":
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def used(self) -> int:
+        total = 0
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:  # 他の処理が削除中のファイル
+                    pass
+        return total
+
+    def remaining(self) -> int:
+        return max(0, self.quota_bytes - self.used())
+
+    def check(self, extra: int = 0):
+        used = self.used() + extra
+        if used > self.quota_bytes:
+            raise QuotaExceeded(
+                f"Workspace {self.path} exceeds its quota "
+                f"({used} > {self.quota_bytes} bytes)"
+            )
@@ -0,0 +1,45 @@
+import unittest
+
+from src.conversations import ConversationStore, estimate_tokens
+
+
+class EstimateTokensTest(unittest.TestCase):
+    def test_ascii_and_japanese(self):
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(estimate_tokens("こんにちは"), 5)
+
+
+class ConversationStoreTest(unittest.TestCase):
+    def test_history_is_trimmed_from_the_oldest(self):
+        store = ConversationStore("system", token_budget=40)
+        for i in range(10):
+            store.append("c", "user", f"質問{i}です")
+        messages = store.messages("c")
+        self.assertEqual(messages[0], {"role": "system", "content": "system"})
+        self.assertEqual(messages[-1]["content"], "質問9です")
+        self.assertLess(len(messages), 11)
+
+    def test_newest_message_is_always_kept(self):
+        store = ConversationStore("system", token_budget=10)
+        store.append("c", "user", "長い" * 100)
+        self.assertEqual(len(store.messages("c")), 2)
+
+    def test_reply_finds_its_conversation(self):
+        store = ConversationStore("system")
+        store.append("c", "user", "質問")
+        store.link(1001, "c")
+        self.assertEqual(store.key_for(1001), "c")
+        self.assertIsNone(store.key_for(1002))
+
+    def test_least_recently_used_are_dropped(self):
+        store = ConversationStore("system", max_conversations=2)
+        for key, message_id in (("a", 1), ("b", 2), ("c", 3)):
+            store.append(key, "user", "質問")
+            store.link(message_id, key)
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.key_for(1))
+        self.assertEqual(store.key_for(3), "c")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from src.dedupe import RecentKeys
+
+
+class RecentKeysTest(unittest.TestCase):
+    def test_redelivered_key_is_dropped(self):
+        keys = RecentKeys()
+        self.assertTrue(keys.add("T1:1700000000.000100"))
+        self.assertFalse(keys.add("T1:1700000000.000100"))
+        self.assertTrue(keys.add("T1:1700000000.000200"))
+        self.assertIn("T1:1700000000.000100", keys)
+
+    def test_keys_expire_after_ttl(self):
+        keys = RecentKeys(ttl=0)
+        self.assertTrue(keys.add("a"))
+        self.assertTrue(keys.add("a"))
+        self.assertNotIn("a", keys)
+
+    def test_oldest_keys_are_forgotten_first(self):
+        keys = RecentKeys(max_keys=2)
+        for key in ("a", "b", "c"):
+            keys.add(key)
+        self.assertEqual(len(keys), 2)
+        self.assertNotIn("a", keys)
+        self.assertIn("c", keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from src.extractors import RegexRule, compile_rule
+
+
+class CompileRuleTest(unittest.TestCase):
+    def test_regex_with_url_and_title(self):
+        rule = compile_rule({"type": "regex", "pattern": r'<a href="(.+?)">(.+?)</a>'})
+        self.assertIsInstance(rule, RegexRule)
+
+    def test_regex_needs_two_groups(self):
+        for pattern in (r'<a href="(.+?)">', r'<a href="(.+?)">(.+?)(</a>)'):
+            with self.subTest(pattern=pattern):
+                with self.assertRaises(ValueError):
+                    compile_rule({"type": "regex", "pattern": pattern})
+
+    def test_invalid_regex(self):
+        with self.assertRaises(ValueError):
+            compile_rule({"type": "regex", "pattern": "("})
+
+
+class SelectorRuleTest(unittest.TestCase):
+    HTML = (
+        '<div class="news"><a href="/1">一件目 <b>新着</b></a>'
+        '<p><a href="/2">子孫</a></p></div><a href="/3">対象外</a>'
+    )
+
+    def test_css_child_selector(self):
+        rule = compile_rule({"type": "css", "selector": "div.news > a"})
+        self.assertEqual(rule.extract(self.HTML), [("/1", "一件目 新着")])
+
+    def test_xpath_descendants(self):
+        rule = compile_rule({"type": "xpath", "path": '//div[@class="news"]//a'})
+        self.assertEqual(
+            rule.extract(self.HTML), [("/1", "一件目 新着"), ("/2", "子孫")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.feeds import discover_feed
+
+PAGE = (
+    "<html><head><title>お知らせ</title>"
+    '<link rel="alternate" type="application/rss+xml" href="/feed.xml">'
+    "</head><body></body></html>"
+).encode("utf-8")
+
+
+class DiscoverFeedTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def page(request: web.Request) -> web.Response:
+            # charsetを付けないContent-Type
+            return web.Response(body=PAGE, headers={"Content-Type": "text/html"})
+
+        app = web.Application()
+        app.router.add_get("/", page)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_page_without_charset(self):
+        url = str(self.client.make_url("/"))
+        feed_url = await discover_feed(self.client.session, url)
+        self.assertEqual(feed_url, str(self.client.make_url("/feed.xml")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.github_api import GitHubClient
+from src.http_client import HttpClient
+
+ISSUES = [[{"number": 1}, {"number": 2}], [{"number": 3}]]
+
+
+class GitHubClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = 0
+
+        async def issues(request: web.Request) -> web.Response:
+            self.requests += 1
+            page = int(request.query.get("page", "1"))
+            etag = f'"page{page}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304)
+            headers = {"ETag": etag}
+            if page < len(ISSUES):
+                url = request.url.update_query(page=page + 1)
+                headers["Link"] = f'<{url}>; rel="next"'
+            return web.json_response(ISSUES[page - 1], headers=headers)
+
+        app = web.Application()
+        app.router.add_get("/repos/owner/name/issues", issues)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.http = HttpClient(retries=0)
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.server.close()
+
+    def client(self, ttl: float) -> GitHubClient:
+        return GitHubClient(self.http, ttl=ttl, base_url=str(self.server.make_url("")))
+
+    async def test_follows_pages(self):
+        issues = await self.client(ttl=60).open_issues("owner/name")
+        self.assertEqual([issue["number"] for issue in issues], [1, 2, 3])
+
+    async def test_repeated_read_within_ttl_is_not_sent(self):
+        github = self.client(ttl=60)
+        await github.open_issues("owner/name")
+        await github.open_issues("owner/name")
+        self.assertEqual(self.requests, 2)
+        self.assertEqual(github.cache_hits, 2)
+
+    async def test_expired_read_is_revalidated(self):
+        github = self.client(ttl=0)
+        first = await github.open_issues("owner/name")
+        self.assertEqual(await github.open_issues("owner/name"), first)
+        self.assertEqual(self.requests, 4)
+        self.assertEqual((github.fetched, github.not_modified), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from src.jobs import CANCELLED, DONE, FAILED, JobCancelled, JobExecutor
+
+
+class JobExecutorTest(unittest.IsolatedAsyncioTestCase):
+    def executor(self, **lanes: int) -> JobExecutor:
+        executor = JobExecutor(lanes)
+        self.addCleanup(executor.close)
+        return executor
+
+    async def test_lanes_do_not_wait_for_each_other(self):
+        executor = self.executor(audio=1, chat=1)
+        release = asyncio.Event()
+
+        async def slow(job):
+            await release.wait()
+
+        async def reply(job):
+            return "返信"
+
+        audio = executor.submit("audio", "音声", slow)
+        chat = executor.submit("chat", "会話", reply)
+        self.assertEqual(await asyncio.wait_for(chat.result(), 1), "返信")
+        self.assertFalse(audio.finished)
+        release.set()
+        await audio.result()
+        self.assertEqual(audio.state, DONE)
+
+    async def test_cancel_queued_and_running_jobs(self):
+        executor = self.executor(audio=1)
+
+        async def forever(job):
+            await asyncio.Event().wait()
+
+        running = executor.submit("audio", "一件目", forever)
+        queued = executor.submit("audio", "二件目", forever)
+        await asyncio.sleep(0)
+        self.assertTrue(executor.cancel(queued.id))
+        self.assertTrue(executor.cancel(running.id))
+        for job in (running, queued):
+            with self.assertRaises(JobCancelled):
+                await job.result()
+            self.assertEqual(job.state, CANCELLED)
+        self.assertFalse(executor.cancel(running.id))
+        self.assertEqual(executor.active(), [])
+
+    async def test_failure_is_raised_to_the_caller(self):
+        executor = self.executor(dev=1)
+
+        async def fail(job):
+            raise RuntimeError("失敗")
+
+        job = executor.submit("dev", "失敗するジョブ", fail)
+        with self.assertRaises(RuntimeError):
+            await job.result()
+        self.assertEqual(job.state, FAILED)
+
+
+if __name__ == "__main__":
+    unittest.main()
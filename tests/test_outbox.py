@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from src.outbox import Outbox
+
+
+class CountingOutbox(Outbox):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.due_queries = 0
+
+    def _due(self, sink: str, limit: int):
+        self.due_queries += 1
+        return super()._due(sink, limit)
+
+
+class OutboxTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "outbox.db")
+
+    def outbox(self, send, **kwargs) -> CountingOutbox:
+        outbox = CountingOutbox(self.path, **kwargs)
+        self.addCleanup(outbox.conn.close)
+        outbox.register_sink("test", send)
+        return outbox
+
+    async def run_for(self, outbox: Outbox, seconds: float):
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+    def test_enqueue_deduplicates_by_key(self):
+        outbox = self.outbox(None)
+        self.assertTrue(outbox.enqueue("test", "a", "本文", "key"))
+        self.assertFalse(outbox.enqueue("test", "a", "別の本文", "key"))
+        self.assertTrue(outbox.enqueue("test", "b", "本文", "key"))
+
+    async def test_retries_in_order(self):
+        sent = []
+        failures = [RuntimeError("一時的な失敗")]
+
+        async def send(destination: str, text: str):
+            if failures:
+                raise failures.pop()
+            sent.append(text)
+
+        outbox = self.outbox(send, retry_base=0.02, retry_cap=0.02)
+        outbox.enqueue("test", "a", "1", "k1")
+        outbox.enqueue("test", "a", "2", "k2")
+        await self.run_for(outbox, 0.2)
+        self.assertEqual(sent, ["1", "2"])
+
+    async def test_failing_head_blocks_only_its_destination(self):
+        sent = []
+
+        async def send(destination: str, text: str):
+            if destination == "a":
+                raise RuntimeError("送信できません")
+            sent.append(text)
+
+        outbox = self.outbox(send, retry_base=60)
+        outbox.enqueue("test", "a", "a1", "k1")
+        outbox.enqueue("test", "a", "a2", "k2")
+        outbox.enqueue("test", "b", "b1", "k3")
+        await self.run_for(outbox, 0.1)
+        self.assertEqual(sent, ["b1"])
+
+    async def test_waits_for_head_row_without_busy_looping(self):
+        async def send(destination: str, text: str):
+            raise RuntimeError("送信できません")
+
+        outbox = self.outbox(send, retry_base=60)
+        outbox.enqueue("test", "a", "a1", "k1")
+        # 先頭の再試行待ちの後ろに、すぐ送れるメッセージが並んでいる
+        outbox.enqueue("test", "a", "a2", "k2")
+        await self.run_for(outbox, 0.3)
+        self.assertGreater(outbox._next_attempt_at("test"), time.time() + 20)
+        self.assertLess(outbox.due_queries, 5)
+
+    def test_purge_removes_old_finished_rows(self):
+        outbox = self.outbox(None, retention_days=1)
+        outbox.enqueue("test", "a", "古い", "k1")
+        outbox.enqueue("test", "a", "未送信", "k2")
+        outbox.conn.execute(
+            "UPDATE outbox SET status = 'sent', created_at = ? WHERE key = 'k1'",
+            (time.time() - 2 * 86400,),
+        )
+        self.assertEqual(outbox.purge(), 1)
+        rows = outbox.conn.execute("SELECT key FROM outbox").fetchall()
+        self.assertEqual(rows, [("k2",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
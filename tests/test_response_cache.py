@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from contextlib import aclosing
+
+from src.response_cache import ResponseCache, request_key
+
+
+async def collect(cache: ResponseCache, key: str, source, cacheable=False) -> str:
+    async with aclosing(cache.stream(key, source, cacheable)) as parts:
+        return "".join([part async for part in parts])
+
+
+class RequestKeyTest(unittest.TestCase):
+    def test_normalizes_spelling(self):
+        a = request_key("gpt", [{"role": "user", "content": "ＡＢＣ  とは？"}])
+        b = request_key("gpt", [{"role": "user", "content": "ABC とは?"}])
+        self.assertEqual(a, b)
+        c = request_key("other", [{"role": "user", "content": "ABC とは?"}])
+        self.assertNotEqual(a, c)
+
+
+class ResponseCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_overlapping_requests_share_one_call(self):
+        cache = ResponseCache()
+        calls = 0
+
+        async def source():
+            nonlocal calls
+            calls += 1
+            for part in ("こん", "にち", "は"):
+                await asyncio.sleep(0.01)
+                yield part
+
+        results = await asyncio.gather(
+            collect(cache, "k", source), collect(cache, "k", source)
+        )
+        self.assertEqual(results, ["こんにちは", "こんにちは"])
+        self.assertEqual(calls, 1)
+        self.assertEqual(cache.coalesced, 1)
+
+    async def test_cacheable_response_is_reused(self):
+        cache = ResponseCache(ttl=60)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            return "答え"
+
+        self.assertEqual(await cache.call("k", fetch, cacheable=True), "答え")
+        self.assertEqual(await cache.call("k", fetch, cacheable=True), "答え")
+        self.assertEqual(await cache.call("k", fetch), "答え")
+        self.assertEqual((calls, cache.hits), (2, 1))
+
+    async def test_failures_are_not_cached(self):
+        cache = ResponseCache(ttl=60)
+        failures = [RuntimeError("APIエラー")]
+
+        async def fetch():
+            if failures:
+                raise failures.pop()
+            return "答え"
+
+        with self.assertRaises(RuntimeError):
+            await cache.call("k", fetch, cacheable=True)
+        self.assertEqual(await cache.call("k", fetch, cacheable=True), "答え")
+        self.assertEqual(cache.hits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from src.scheduler import PollScheduler, backoff_delay, parse_retry_after
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after("-5"), 0.0)
+
+    def test_http_date(self):
+        delay = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+        self.assertIsNotNone(delay)
+        self.assertAlmostEqual(delay, 60, delta=2)
+
+    def test_missing_or_invalid(self):
+        for value in (None, "", "そのうち"):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_retry_after(value))
+
+
+class BackoffTest(unittest.TestCase):
+    def test_doubles_up_to_cap(self):
+        for failures, expected in ((1, 10), (2, 20), (3, 40), (10, 100)):
+            with self.subTest(failures=failures):
+                delay = backoff_delay(failures, base=10, cap=100)
+                self.assertGreaterEqual(delay, expected / 2)
+                self.assertLessEqual(delay, expected)
+
+
+class PollSchedulerTest(unittest.TestCase):
+    def scheduler(self) -> PollScheduler:
+        scheduler: PollScheduler = PollScheduler(error_base=10, error_cap=100)
+        scheduler.add("site", interval=300, min_interval=60, max_interval=3600)
+        return scheduler
+
+    def test_failures_back_off(self):
+        scheduler = self.scheduler()
+        delays = [scheduler.failure("site") for _ in range(4)]
+        self.assertLessEqual(delays[0], 10)
+        self.assertGreaterEqual(delays[3], 40)
+        self.assertEqual(scheduler.states["site"].failures, 4)
+
+    def test_failure_waits_for_retry_after(self):
+        scheduler = self.scheduler()
+        self.assertEqual(scheduler.failure("site", retry_after=500), 500)
+
+    def test_success_resets_failures(self):
+        scheduler = self.scheduler()
+        scheduler.failure("site")
+        scheduler.success("site", changed=False)
+        state = scheduler.states["site"]
+        self.assertEqual(state.failures, 0)
+        # 変化がなければ間隔を広げる
+        self.assertEqual(state.interval, 450)
+
+    def test_interval_stays_within_bounds(self):
+        scheduler = self.scheduler()
+        for _ in range(20):
+            scheduler.success("site", changed=False)
+        self.assertEqual(scheduler.states["site"].interval, 3600)
+
+
+if __name__ == "__main__":
+    unittest.main()
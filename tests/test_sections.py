@@ -0,0 +1,43 @@
+import unittest
+
+from src.sections import SectionRule, diff_sections
+
+
+def fingerprints(html: str) -> list:
+    return SectionRule().extract(html)
+
+
+class DiffSectionsTest(unittest.TestCase):
+    OLD = (
+        '<h2 id="news">お知らせ</h2><p>臨時休業のお知らせ</p>'
+        "<h2>イベント</h2><p>夏祭りを開催します</p>"
+    )
+
+    def test_unchanged_page(self):
+        self.assertEqual(
+            diff_sections(fingerprints(self.OLD), fingerprints(self.OLD)), []
+        )
+
+    def test_changed_section_keeps_its_anchor(self):
+        new = self.OLD.replace("臨時休業", "営業再開")
+        changes = diff_sections(fingerprints(self.OLD), fingerprints(new))
+        self.assertEqual([c[:3] for c in changes], [("changed", "#news", "お知らせ")])
+
+    def test_added_section(self):
+        new = self.OLD + "<h2>採用情報</h2><p>スタッフを募集しています</p>"
+        changes = diff_sections(fingerprints(self.OLD), fingerprints(new))
+        self.assertEqual([c[:3] for c in changes], [("added", "", "採用情報")])
+
+    def test_scripts_are_ignored(self):
+        new = self.OLD.replace(
+            "<h2>イベント", "<script>var t = 1;</script><h2>イベント"
+        )
+        self.assertEqual(diff_sections(fingerprints(self.OLD), fingerprints(new)), [])
+
+    def test_max_sections(self):
+        html = "".join(f"<h2>見出し{i}</h2><p>本文{i}</p>" for i in range(5))
+        self.assertEqual(len(SectionRule(max_sections=3).extract(html)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import types
+import unittest
+
+import discord
+
+from src.sender import _retry_after, split_message
+
+
+class SplitMessageTest(unittest.TestCase):
+    def assertSplit(self, text: str, limit: int) -> list[str]:
+        chunks = split_message(text, limit)
+        self.assertEqual("".join(chunks), text)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), limit)
+            self.assertTrue(chunk.strip())
+        return chunks
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_message("こんにちは", 10), ["こんにちは"])
+
+    def test_english_sentences(self):
+        text = "This is the first sentence. Here is another one! And a third?"
+        chunks = self.assertSplit(text, 30)
+        self.assertEqual(chunks[0], "This is the first sentence. ")
+
+    def test_japanese_sentences(self):
+        text = "今日は晴れです。明日は雨が降るでしょう。週末は曇りの予報です。"
+        chunks = self.assertSplit(text, 12)
+        self.assertEqual(chunks[0], "今日は晴れです。")
+
+    def test_prefers_line_ends(self):
+        text = "一行目です。続きです。\n二行目\n三行目"
+        chunks = self.assertSplit(text, 15)
+        self.assertEqual(chunks[0], "一行目です。続きです。\n")
+
+    def test_single_token_is_cut(self):
+        text = "x" * 25
+        self.assertEqual(self.assertSplit(text, 10), ["x" * 10, "x" * 10, "x" * 5])
+
+    def test_leading_whitespace_is_not_a_chunk(self):
+        self.assertSplit("\n\n" + "y" * 20, 10)
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_discord_rate_limit(self):
+        response = types.SimpleNamespace(
+            status=429, reason="Too Many Requests", headers={"Retry-After": "3"}
+        )
+        self.assertEqual(_retry_after(discord.HTTPException(response, "")), 3.0)
+
+    def test_slack_rate_limit_without_header(self):
+        error = Exception()
+        error.response = types.SimpleNamespace(status_code=429)  # type: ignore
+        self.assertEqual(_retry_after(error), 1.0)
+
+    def test_error_without_response(self):
+        error = Exception()
+        error.response = None  # type: ignore
+        self.assertIsNone(_retry_after(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
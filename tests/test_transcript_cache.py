@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.transcript_cache import TranscriptCache, cache_key
+
+
+class TranscriptCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "state.db")
+
+    def cache(self, **kwargs) -> TranscriptCache:
+        cache = TranscriptCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_key_depends_on_settings(self):
+        self.assertEqual(
+            cache_key("file", "abc", "whisper-1", "用語"),
+            cache_key("file", "abc", "whisper-1", "用語"),
+        )
+        self.assertNotEqual(
+            cache_key("file", "abc", "whisper-1", "用語"),
+            cache_key("file", "abc", "whisper-1", ""),
+        )
+
+    def test_round_trip(self):
+        cache = self.cache()
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", "書き起こし" * 100)
+        self.assertEqual(cache.get("k"), "書き起こし" * 100)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # 別の接続からも読める
+        self.assertEqual(self.cache().get("k"), "書き起こし" * 100)
+
+    def test_least_recently_used_are_evicted(self):
+        # 圧縮が効かないテキストにする
+        cache = self.cache(max_bytes=100)
+        cache.put("a", os.urandom(60).hex())
+        cache.put("b", os.urandom(60).hex())
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("b"))
+
+    def test_old_entries_expire(self):
+        cache = self.cache(max_age_days=0)
+        cache.put("k", "古い")
+        self.assertIsNone(cache.get("k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.extractors import compile_rule, extract_stream
+from src.snapshot_store import SnapshotStore
+from src.watcher import FetchState, SiteWatcher, WatchTarget, fetch_entries
+
+
+def page(*news: int) -> bytes:
+    return "".join(
+        f'<h3 class="title01"><a href="/news/{n}">お知らせ{n}</a></h3>' for n in news
+    ).encode("utf-8")
+
+
+def etag_of(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+async def chunks_of(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+class ExtractStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def test_multibyte_split_across_chunks(self):
+        # 3バイトずつに切り、文字の途中でチャンクが分かれるようにする
+        entries, stopped = await extract_stream(
+            chunks_of(page(1, 2), 3), compile_rule("title01")
+        )
+        self.assertEqual(entries, [("/news/1", "お知らせ1"), ("/news/2", "お知らせ2")])
+        self.assertFalse(stopped)
+
+
+class WatchServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.body = page(1, 2)
+
+        async def handler(request: web.Request) -> web.Response:
+            etag = etag_of(self.body)
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304)
+            # charsetを付けないContent-Type
+            return web.Response(
+                body=self.body, headers={"Content-Type": "text/html", "ETag": etag}
+            )
+
+        app = web.Application()
+        app.router.add_get("/", handler)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+        self.url = str(self.client.make_url("/"))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+
+class FetchEntriesTest(WatchServerTestCase):
+    async def test_page_without_charset(self):
+        result = await fetch_entries(
+            self.client.session, self.url, compile_rule("title01"), FetchState()
+        )
+        self.assertIsNotNone(result)
+        entries, state = result
+        self.assertEqual(entries, [("/news/1", "お知らせ1"), ("/news/2", "お知らせ2")])
+        self.assertEqual(state.etag, etag_of(self.body))
+
+    async def test_state_is_not_modified(self):
+        state = FetchState()
+        await fetch_entries(
+            self.client.session, self.url, compile_rule("title01"), state
+        )
+        self.assertEqual(state, FetchState())
+
+
+class SiteWatcherTest(WatchServerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = SnapshotStore(os.path.join(tmp.name, "state.db"))
+        self.addCleanup(self.store.close)
+
+    async def test_update_is_retried_after_failed_notify(self):
+        notified = []
+        failures = [RuntimeError("送信失敗")]
+
+        async def notify(target: WatchTarget, entries: list, revision: str):
+            if failures:
+                raise failures.pop()
+            notified.append(entries)
+
+        target = WatchTarget("news", self.url, channel_id=1, newest_first=False)
+        watcher = SiteWatcher([target], notify, self.store)
+        session = self.client.session
+        self.assertFalse(await watcher.check(session, target))
+
+        self.body = page(1, 2, 3)
+        with self.assertRaises(RuntimeError):
+            await watcher.check(session, target)
+        # 通知に失敗した更新は、次の確認で改めて通知される
+        self.assertTrue(await watcher.check(session, target))
+        self.assertEqual(notified, [[("/news/3", "お知らせ3")]])
+        self.assertFalse(await watcher.check(session, target))
+
+    async def test_each_section_update_gets_its_own_revision(self):
+        revisions = []
+
+        async def notify(target: WatchTarget, entries: list, revision: str):
+            revisions.append((entries, revision))
+
+        self.body = "<h2>お知らせ</h2><p>一回目</p>".encode("utf-8")
+        target = WatchTarget(
+            "sections", self.url, channel_id=1, extractor={"type": "sections"}
+        )
+        watcher = SiteWatcher([target], notify, self.store)
+        session = self.client.session
+        await watcher.check(session, target)
+        for text in ("二回目の内容", "三回目の内容"):
+            self.body = f"<h2>お知らせ</h2><p>{text}</p>".encode("utf-8")
+            self.assertTrue(await watcher.check(session, target))
+        # 表示は同じでも、更新ごとに別のリビジョンになる
+        (first, first_revision), (second, second_revision) = revisions
+        self.assertEqual(first, second)
+        self.assertNotEqual(first_revision, second_revision)
+
+
+if __name__ == "__main__":
+    unittest.main()
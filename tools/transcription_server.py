@@ -0,0 +1,85 @@
+"""
+Stand-in for OpenAI's `POST /v1/audio/transcriptions`, for offline runs.
+
+By default it answers with a canned text describing the upload after an
+optional delay; with `--local MODEL` it transcribes for real with
+`LocalWhisperBackend`. Point the bot at it with
+`TRANSCRIBE_BASE_URL = "http://127.0.0.1:8000/v1"`.
+
+Run from the repository root:
+
+    python -m tools.transcription_server [--port 8000] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+
+from aiohttp import BodyPartReader, web
+
+from src.transcription_backends import LocalWhisperBackend, TranscriptionBackend
+
+
+def stub_text(data: bytes, prompt: str) -> str:
+    digest = hashlib.blake2b(data, digest_size=4).hexdigest()
+    return f"[stub transcript {digest}, {len(data)} bytes, prompt {len(prompt)} chars]"
+
+
+def create_app(
+    backend: TranscriptionBackend | None = None, latency: float = 0.0
+) -> web.Application:
+    async def transcriptions(request: web.Request) -> web.Response:
+        fields: dict[str, str] = {}
+        data = b""
+        filename = "audio"
+        reader = await request.multipart()
+        while (part := await reader.next()) is not None:
+            if not isinstance(part, BodyPartReader):
+                continue
+            if part.name == "file":
+                filename = part.filename or filename
+                data = await part.read()
+            else:
+                fields[part.name or ""] = await part.text()
+        if not data:
+            return web.json_response(
+                {"error": {"message": "file is required", "type": "invalid_request"}},
+                status=400,
+            )
+        prompt = fields.get("prompt", "")
+        if latency:
+            await asyncio.sleep(latency)
+        if backend is None:
+            text = stub_text(data, prompt)
+        else:
+            suffix = os.path.splitext(filename)[1]
+            with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+                f.write(data)
+                f.flush()
+                text = await backend.transcribe(f.name, prompt)
+        if fields.get("response_format") == "text":
+            return web.Response(text=text)
+        return web.json_response({"text": text})
+
+    app = web.Application(client_max_size=26 * 1024 * 1024)
+    app.router.add_post("/v1/audio/transcriptions", transcriptions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--local", metavar="MODEL", help="faster-whisper model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    backend = LocalWhisperBackend(args.local) if args.local else None
+    web.run_app(create_app(backend, args.latency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()